@@ -1,36 +1,89 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, make_response, current_app
 from flask_login import login_required, current_user
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 import json
-from models import db, TradeShow, Expense, Company, User, ExpenseCategory
-from utils import accounting_required, push_expense_to_zoho, generate_expense_report
+import hashlib
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from models import db, TradeShow, Expense, Company, User, ExpenseCategory, monthly_expense_view, use_monthly_expense_view, refresh_monthly_expense_view
+from utils import cache, ZOHO_TOKEN_CACHE_KEY, get_active_companies, get_tradeshows, accounting_required, push_expense_to_zoho, push_expenses_to_zoho, enqueue_zoho_push, generate_expense_report, bump_report_version, keyset_paginate
 
 accounting_bp = Blueprint('accounting', __name__)
 
+# A queued push holding 'pushing' longer than this lost its worker mid-job
+PUSH_CLAIM_TIMEOUT = timedelta(minutes=15)
+
+# Dashboard aggregates, cached briefly since they only move on status changes
+@cache.memoize(timeout=60)
+def _expense_status_counts():
+    """Pending, approved-not-pushed, pushing and processed-this-month counts in one scan"""
+    current_month = date.today().replace(day=1)
+    counts = db.session.query(
+        db.func.count().filter(Expense.status == 'pending').label('pending'),
+        db.func.count().filter(db.and_(
+            Expense.status == 'approved',
+            Expense.pushed_to_zoho == False
+        )).label('approved_not_pushed'),
+        db.func.count().filter(Expense.status == 'pushing').label('pushing'),
+        db.func.count().filter(db.and_(
+            Expense.status == 'processed',
+            Expense.zoho_push_date >= current_month
+        )).label('monthly_processed')
+    ).one()
+    return counts.pending, counts.approved_not_pushed, counts.pushing, counts.monthly_processed
+
+def invalidate_expense_caches():
+    """Drop cached aggregates after an expense changes status"""
+    cache.delete_memoized(_expense_stats_payload)
+    cache.delete_memoized(_expense_status_counts)
+    bump_report_version()
+
+def release_stale_push_claims():
+    """Put expenses stuck in 'pushing' past PUSH_CLAIM_TIMEOUT back to approved; returns how many"""
+    released = db.session.execute(
+        update(Expense).where(
+            Expense.status == 'pushing',
+            Expense.updated_at < datetime.utcnow() - PUSH_CLAIM_TIMEOUT
+        ).values(status='approved')
+    ).rowcount
+    db.session.commit()
+    if released:
+        invalidate_expense_caches()
+    return released
+
+def record_zoho_push(expense, zoho_response, refresh_view=True):
+    """
+    Mark an expense as processed after a successful Zoho Books push
+    Queued pushes pass refresh_view=False and schedule one shared view refresh instead
+    """
+    expense.zoho_expense_id = zoho_response.get('expense_id')
+    expense.pushed_to_zoho = True
+    expense.zoho_push_date = datetime.utcnow()
+    expense.status = 'processed'
+    
+    db.session.commit()
+    if refresh_view:
+        refresh_monthly_expense_view()
+    invalidate_expense_caches()
+
 @accounting_bp.route('/dashboard')
 @login_required
 @accounting_required
 def dashboard():
-    # Get pending expenses count
-    pending_expenses = Expense.query.filter_by(status='pending').count()
-    
-    # Get approved but not pushed to Zoho
-    approved_not_pushed = Expense.query.filter_by(status='approved', pushed_to_zoho=False).count()
-    
-    # Get total processed expenses this month
-    current_month = date.today().replace(day=1)
-    monthly_processed = Expense.query.filter(
-        Expense.status == 'processed',
-        Expense.zoho_push_date >= current_month
-    ).count()
+    # Get pending, approved-but-not-pushed and processed-this-month counts
+    pending_expenses, approved_not_pushed, pushing_expenses, monthly_processed = _expense_status_counts()
     
     # Get recent activities
-    recent_expenses = Expense.query.order_by(Expense.created_at.desc()).limit(10).all()
+    recent_expenses = Expense.query.options(
+        joinedload(Expense.user),
+        joinedload(Expense.tradeshow)
+    ).order_by(Expense.created_at.desc()).limit(10).all()
     
     return render_template('accounting/dashboard.html',
                          pending_expenses=pending_expenses,
                          approved_not_pushed=approved_not_pushed,
+                         pushing_expenses=pushing_expenses,
                          monthly_processed=monthly_processed,
                          recent_expenses=recent_expenses)
 
@@ -38,12 +91,17 @@ def dashboard():
 @login_required
 @accounting_required
 def expenses():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     status_filter = request.args.get('status', 'all')
     tradeshow_filter = request.args.get('tradeshow', 'all')
     company_filter = request.args.get('company', 'all')
     
-    query = Expense.query
+    query = Expense.query.options(
+        joinedload(Expense.user),
+        joinedload(Expense.company),
+        joinedload(Expense.category),
+        joinedload(Expense.tradeshow)
+    )
     
     # Apply filters
     if status_filter != 'all':
@@ -53,15 +111,17 @@ def expenses():
     if company_filter != 'all':
         query = query.filter_by(company_id=company_filter)
     
-    expenses = query.order_by(Expense.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    expenses, next_cursor = keyset_paginate(query, Expense.created_at, Expense.id,
+                                            after=cursor, per_page=20)
     
     # Get filter options
-    tradeshows = TradeShow.query.all()
-    companies = Company.query.filter_by(is_active=True).all()
+    tradeshows = get_tradeshows()
+    companies = get_active_companies()
     
     return render_template('accounting/expenses.html',
                          expenses=expenses,
+                         cursor=cursor,
+                         next_cursor=next_cursor,
                          tradeshows=tradeshows,
                          companies=companies,
                          status_filter=status_filter,
@@ -73,7 +133,7 @@ def expenses():
 @accounting_required
 def expense_detail(id):
     expense = Expense.query.get_or_404(id)
-    companies = Company.query.filter_by(is_active=True).all()
+    companies = get_active_companies()
     return render_template('accounting/expense_detail.html', expense=expense, companies=companies)
 
 @accounting_bp.route('/expenses/<int:id>/approve', methods=['POST'])
@@ -97,6 +157,7 @@ def approve_expense(id):
     expense.approved_at = datetime.utcnow()
     
     db.session.commit()
+    invalidate_expense_caches()
     
     flash('Expense approved successfully!', 'success')
     return redirect(url_for('accounting.expense_detail', id=id))
@@ -116,6 +177,7 @@ def reject_expense(id):
     expense.approved_at = datetime.utcnow()
     
     db.session.commit()
+    invalidate_expense_caches()
     
     flash('Expense rejected.', 'info')
     return redirect(url_for('accounting.expenses'))
@@ -126,6 +188,10 @@ def reject_expense(id):
 def push_to_zoho(id):
     expense = Expense.query.get_or_404(id)
     
+    if expense.status == 'pushing':
+        flash('Expense is already being pushed to Zoho.', 'info')
+        return redirect(url_for('accounting.expense_detail', id=id))
+    
     if expense.status != 'approved':
         flash('Only approved expenses can be pushed to Zoho.', 'warning')
         return redirect(url_for('accounting.expense_detail', id=id))
@@ -138,18 +204,18 @@ def push_to_zoho(id):
         flash('Please assign a company to this expense first.', 'error')
         return redirect(url_for('accounting.expense_detail', id=id))
     
+    # Hand the Zoho round-trip to a background worker when a queue is configured
+    if current_app.config['ZOHO_PUSH_QUEUE']:
+        enqueue_zoho_push(expense.id)
+        flash('Expense queued for push to Zoho.', 'info')
+        return redirect(url_for('accounting.expense_detail', id=id))
+    
     try:
         # Push to Zoho Books
         zoho_response = push_expense_to_zoho(expense)
         
         if zoho_response.get('success'):
-            expense.zoho_expense_id = zoho_response.get('expense_id')
-            expense.pushed_to_zoho = True
-            expense.zoho_push_date = datetime.utcnow()
-            expense.status = 'processed'
-            
-            db.session.commit()
-            
+            record_zoho_push(expense, zoho_response)
             flash('Expense pushed to Zoho successfully!', 'success')
         else:
             flash(f'Error pushing to Zoho: {zoho_response.get("error", "Unknown error")}', 'error')
@@ -169,37 +235,72 @@ def bulk_push_to_zoho():
         flash('No expenses selected.', 'warning')
         return redirect(url_for('accounting.expenses'))
     
-    success_count = 0
+    # Selected expenses whose earlier queued push died are eligible again
+    release_stale_push_claims()
+    
+    # Load every eligible expense, with what the Zoho payload needs, in one query
+    expenses = Expense.query.options(
+        joinedload(Expense.company),
+        joinedload(Expense.user),
+        joinedload(Expense.tradeshow),
+        joinedload(Expense.receipt)
+    ).filter(
+        Expense.id.in_(expense_ids),
+        Expense.status == 'approved',
+        Expense.pushed_to_zoho == False,
+        Expense.company_id.isnot(None)
+    ).all()
+    
+    if current_app.config['ZOHO_PUSH_QUEUE']:
+        for expense in expenses:
+            enqueue_zoho_push(expense.id)
+        flash(f'Bulk push queued: {len(expenses)} expenses.', 'info')
+        return redirect(url_for('accounting.expenses'))
+    
+    pushed = []
     error_count = 0
+    push_date = datetime.utcnow()
     
-    for expense_id in expense_ids:
-        try:
-            expense = Expense.query.get(expense_id)
-            if expense and expense.status == 'approved' and not expense.pushed_to_zoho and expense.company:
-                zoho_response = push_expense_to_zoho(expense)
-                
-                if zoho_response.get('success'):
-                    expense.zoho_expense_id = zoho_response.get('expense_id')
-                    expense.pushed_to_zoho = True
-                    expense.zoho_push_date = datetime.utcnow()
-                    expense.status = 'processed'
-                    success_count += 1
-                else:
-                    error_count += 1
-        except Exception:
+    for expense, zoho_response in push_expenses_to_zoho(expenses):
+        if zoho_response.get('success'):
+            pushed.append({
+                'id': expense.id,
+                'zoho_expense_id': zoho_response.get('expense_id'),
+                'pushed_to_zoho': True,
+                'zoho_push_date': push_date,
+                'status': 'processed'
+            })
+        else:
             error_count += 1
     
+    # One executemany UPDATE keyed by primary key instead of a flush per expense
+    if pushed:
+        db.session.execute(update(Expense), pushed)
     db.session.commit()
     
+    if pushed:
+        refresh_monthly_expense_view()
+        invalidate_expense_caches()
+    
+    success_count = len(pushed)
+    
     flash(f'Bulk push completed: {success_count} successful, {error_count} errors.', 'info')
     return redirect(url_for('accounting.expenses'))
 
+@accounting_bp.route('/expenses/release-stale-pushes', methods=['POST'])
+@login_required
+@accounting_required
+def release_stale_pushes():
+    released = release_stale_push_claims()
+    flash(f'{released} stuck Zoho pushes moved back to approved.', 'info')
+    return redirect(url_for('accounting.expenses', status='approved'))
+
 @accounting_bp.route('/reports')
 @login_required
 @accounting_required
 def reports():
-    tradeshows = TradeShow.query.all()
-    companies = Company.query.filter_by(is_active=True).all()
+    tradeshows = get_tradeshows()
+    companies = get_active_companies()
     return render_template('accounting/reports.html', tradeshows=tradeshows, companies=companies)
 
 @accounting_bp.route('/reports/generate', methods=['POST'])
@@ -218,13 +319,17 @@ def generate_report():
             report_type=report_type,
             tradeshow_id=tradeshow_id,
             company_id=company_id,
-            start_date=datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
-            end_date=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+            start_date=date.fromisoformat(start_date) if start_date else None,
+            end_date=date.fromisoformat(end_date) if end_date else None
         )
         
         if report_type == 'excel':
+            if not report_data.get('success'):
+                flash(f'Error generating report: {report_data.get("error", "Unknown error")}', 'error')
+                return redirect(url_for('accounting.reports'))
+            
             return send_file(
-                report_data['file_path'],
+                report_data['file'],
                 as_attachment=True,
                 download_name=report_data['filename'],
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -259,19 +364,17 @@ def configure_zoho(id):
         company.zoho_refresh_token = zoho_refresh_token
         
         db.session.commit()
+        # The cached token belongs to the old credentials
+        cache.delete(ZOHO_TOKEN_CACHE_KEY.format(company.id))
         
         flash(f'Zoho configuration updated for {company.name}!', 'success')
         return redirect(url_for('accounting.companies'))
     
     return render_template('accounting/configure_zoho.html', company=company)
 
-@accounting_bp.route('/api/expense-stats')
-@login_required
-@accounting_required
-def expense_stats():
-    """API endpoint for dashboard charts"""
+def _expense_stats_live(current_year):
+    """Aggregate processed expenses straight from the expense table"""
     # Get monthly expense totals for the current year
-    current_year = date.today().year
     monthly_stats = db.session.query(
         db.func.extract('month', Expense.expense_date).label('month'),
         db.func.sum(Expense.amount).label('total')
@@ -296,8 +399,72 @@ def expense_stats():
         Expense.status == 'processed'
     ).group_by(Company.name).all()
     
-    return jsonify({
+    return monthly_stats, category_stats, company_stats
+
+def _expense_stats_from_view(current_year):
+    """Read the same aggregates from the pre-computed monthly view"""
+    mv = monthly_expense_view
+    
+    # Get monthly expense totals for the current year
+    month = db.func.extract('month', mv.c.month)
+    monthly_stats = db.session.query(
+        month.label('month'),
+        db.func.sum(mv.c.total).label('total')
+    ).filter(
+        mv.c.month >= date(current_year, 1, 1),
+        mv.c.month < date(current_year + 1, 1, 1)
+    ).group_by(month).all()
+    
+    # Get expense breakdown by category
+    category_stats = db.session.query(
+        ExpenseCategory.name,
+        db.func.sum(mv.c.total).label('total')
+    ).join(mv, mv.c.category_id == ExpenseCategory.id).group_by(ExpenseCategory.name).all()
+    
+    # Get company breakdown
+    company_stats = db.session.query(
+        Company.name,
+        db.func.sum(mv.c.total).label('total')
+    ).join(mv, mv.c.company_id == Company.id).group_by(Company.name).all()
+    
+    return monthly_stats, category_stats, company_stats
+
+@cache.memoize(timeout=300)
+def _expense_stats_payload():
+    """Chart data for the dashboard, cached until the next push"""
+    current_year = date.today().year
+    if use_monthly_expense_view():
+        monthly_stats, category_stats, company_stats = _expense_stats_from_view(current_year)
+    else:
+        monthly_stats, category_stats, company_stats = _expense_stats_live(current_year)
+    
+    return {
         'monthly': [{'month': int(stat.month), 'total': float(stat.total)} for stat in monthly_stats],
         'categories': [{'name': stat.name, 'total': float(stat.total)} for stat in category_stats],
         'companies': [{'name': stat.name, 'total': float(stat.total)} for stat in company_stats]
-    })
\ No newline at end of file
+    }
+
+def _expense_stats_etag():
+    """Cheap fingerprint of the processed expense set"""
+    processed_count, last_push = db.session.query(
+        db.func.count(Expense.id),
+        db.func.max(Expense.zoho_push_date)
+    ).filter(Expense.status == 'processed').one()
+    signature = f"{date.today().year}:{processed_count}:{last_push}"
+    return hashlib.md5(signature.encode()).hexdigest()
+
+@accounting_bp.route('/api/expense-stats')
+@login_required
+@accounting_required
+def expense_stats():
+    """API endpoint for dashboard charts"""
+    # Let polling clients revalidate without recomputing the aggregates
+    etag = _expense_stats_etag()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = jsonify(_expense_stats_payload())
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
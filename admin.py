@@ -1,22 +1,57 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from werkzeug.security import generate_password_hash
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from datetime import datetime
-from models import db, User, Company, TradeShow, Expense, ExpenseCategory
-from utils import admin_required
+from models import db, User, Company, TradeShow, TradeShowAssignment, Expense, ExpenseCategory
+from utils import cache, hash_password, admin_required, keyset_paginate, bump_lookup_version
 
 admin_bp = Blueprint('admin', __name__)
 
+# Labels for the activity types merged in system_logs
+SYSTEM_LOG_ACTIONS = {
+    'user': 'User Created',
+    'tradeshow': 'Trade Show Created',
+    'expense': 'Expense Submitted'
+}
+SYSTEM_LOG_DETAILS = {
+    'user': 'User "{name}" was created',
+    'tradeshow': 'Trade show "{name}" was created',
+    'expense': 'Expense "{name}" was submitted'
+}
+
+@cache.memoize(timeout=60)
+def _system_totals():
+    """System-wide counters for the dashboard, cached briefly"""
+    return {
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(is_active=True).count(),
+        'total_tradeshows': TradeShow.query.count(),
+        'total_expenses': Expense.query.count(),
+        'total_expense_amount': db.session.query(db.func.sum(Expense.amount)).scalar() or 0
+    }
+
+def _find_user_conflict(username, email, exclude_id=None):
+    """Return the (username, email) of a user clashing on either field, in one query"""
+    query = db.session.query(User.username, User.email).filter(
+        db.or_(User.username == username, User.email == email)
+    )
+    if exclude_id is not None:
+        query = query.filter(User.id != exclude_id)
+    return query.first()
+
+def _duplicate_user_message(existing, username):
+    """Flash message naming whichever unique field is already taken"""
+    if existing and existing.username == username:
+        return 'Username already exists.'
+    return 'Email already exists.'
+
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
 def dashboard():
     # Get system statistics
-    total_users = User.query.count()
-    active_users = User.query.filter_by(is_active=True).count()
-    total_tradeshows = TradeShow.query.count()
-    total_expenses = Expense.query.count()
-    total_expense_amount = db.session.query(db.func.sum(Expense.amount)).scalar() or 0
+    totals = _system_totals()
     
     # Get recent activities
     recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
@@ -24,11 +59,11 @@ def dashboard():
     recent_expenses = Expense.query.order_by(Expense.created_at.desc()).limit(10).all()
     
     return render_template('admin/dashboard.html',
-                         total_users=total_users,
-                         active_users=active_users,
-                         total_tradeshows=total_tradeshows,
-                         total_expenses=total_expenses,
-                         total_expense_amount=total_expense_amount,
+                         total_users=totals['total_users'],
+                         active_users=totals['active_users'],
+                         total_tradeshows=totals['total_tradeshows'],
+                         total_expenses=totals['total_expenses'],
+                         total_expense_amount=totals['total_expense_amount'],
                          recent_users=recent_users,
                          recent_tradeshows=recent_tradeshows,
                          recent_expenses=recent_expenses)
@@ -37,7 +72,7 @@ def dashboard():
 @login_required
 @admin_required
 def users():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     role_filter = request.args.get('role', 'all')
     status_filter = request.args.get('status', 'all')
     search_query = request.args.get('search', '')
@@ -52,6 +87,7 @@ def users():
     elif status_filter == 'inactive':
         query = query.filter_by(is_active=False)
     if search_query:
+        # Served by the trigram indexes on User when running on PostgreSQL
         query = query.filter(
             db.or_(
                 User.username.contains(search_query),
@@ -60,11 +96,13 @@ def users():
             )
         )
     
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    users, next_cursor = keyset_paginate(query, User.created_at, User.id,
+                                         after=cursor, per_page=20)
     
     return render_template('admin/users.html',
                          users=users,
+                         cursor=cursor,
+                         next_cursor=next_cursor,
                          role_filter=role_filter,
                          status_filter=status_filter,
                          search_query=search_query)
@@ -86,27 +124,29 @@ def create_user():
             flash('Please fill in all required fields.', 'error')
             return render_template('admin/create_user.html')
         
-        # Check if username or email already exists
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists.', 'error')
-            return render_template('admin/create_user.html')
-        
-        if User.query.filter_by(email=email).first():
-            flash('Email already exists.', 'error')
-            return render_template('admin/create_user.html')
-        
-        # Create new user
+        # Create new user; the unique constraints reject duplicates
         user = User(
             username=username,
             email=email,
             full_name=full_name,
             role=role,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             is_active=is_active
         )
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = _find_user_conflict(username, email)
+            if existing:
+                flash(_duplicate_user_message(existing, username), 'error')
+            else:
+                # Some other constraint failed; don't blame the username or email
+                current_app.logger.exception(f'Could not create user "{username}"')
+                flash('Could not create user. Please check the details and try again.', 'error')
+            return render_template('admin/create_user.html')
         
         flash(f'User "{username}" created successfully!', 'success')
         return redirect(url_for('admin.users'))
@@ -120,14 +160,18 @@ def user_detail(id):
     user = User.query.get_or_404(id)
     
     # Get user's trade show assignments
-    assignments = user.assignments.all()
+    assignments = TradeShowAssignment.query.options(
+        joinedload(TradeShowAssignment.tradeshow)
+    ).filter_by(user_id=id).all()
     
     # Get user's expenses
-    expenses = user.expenses.order_by(Expense.created_at.desc()).limit(10).all()
+    expenses = Expense.query.filter_by(user_id=id).order_by(Expense.created_at.desc()).limit(10).all()
     
-    # Calculate user statistics
-    total_expenses = db.session.query(db.func.sum(Expense.amount)).filter_by(user_id=id).scalar() or 0
-    expense_count = user.expenses.count()
+    # Calculate user statistics in one aggregate query
+    expense_count, total_expenses = db.session.query(
+        db.func.count(Expense.id),
+        db.func.coalesce(db.func.sum(Expense.amount), 0)
+    ).filter(Expense.user_id == id).one()
     
     return render_template('admin/user_detail.html',
                          user=user,
@@ -156,12 +200,9 @@ def edit_user(id):
             return render_template('admin/edit_user.html', user=user)
         
         # Check if username or email already exists (excluding current user)
-        if User.query.filter(User.username == username, User.id != id).first():
-            flash('Username already exists.', 'error')
-            return render_template('admin/edit_user.html', user=user)
-        
-        if User.query.filter(User.email == email, User.id != id).first():
-            flash('Email already exists.', 'error')
+        existing = _find_user_conflict(username, email, exclude_id=id)
+        if existing:
+            flash(_duplicate_user_message(existing, username), 'error')
             return render_template('admin/edit_user.html', user=user)
         
         # Update user
@@ -172,7 +213,7 @@ def edit_user(id):
         user.is_active = is_active
         
         if password:  # Only update password if provided
-            user.password_hash = generate_password_hash(password)
+            user.password_hash = hash_password(password)
         
         db.session.commit()
         
@@ -217,13 +258,15 @@ def create_company():
             flash('Company name is required.', 'error')
             return render_template('admin/create_company.html')
         
-        if Company.query.filter_by(name=name).first():
-            flash('Company name already exists.', 'error')
-            return render_template('admin/create_company.html')
-        
         company = Company(name=name)
         db.session.add(company)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Company name already exists.', 'error')
+            return render_template('admin/create_company.html')
+        bump_lookup_version()
         
         flash(f'Company "{name}" created successfully!', 'success')
         return redirect(url_for('admin.companies'))
@@ -237,6 +280,7 @@ def toggle_company_status(id):
     company = Company.query.get_or_404(id)
     company.is_active = not company.is_active
     db.session.commit()
+    bump_lookup_version()
     
     status = 'activated' if company.is_active else 'deactivated'
     flash(f'Company "{company.name}" {status} successfully!', 'success')
@@ -261,13 +305,15 @@ def create_category():
             flash('Category name is required.', 'error')
             return render_template('admin/create_category.html')
         
-        if ExpenseCategory.query.filter_by(name=name).first():
-            flash('Category name already exists.', 'error')
-            return render_template('admin/create_category.html')
-        
         category = ExpenseCategory(name=name, description=description)
         db.session.add(category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Category name already exists.', 'error')
+            return render_template('admin/create_category.html')
+        bump_lookup_version()
         
         flash(f'Category "{name}" created successfully!', 'success')
         return redirect(url_for('admin.categories'))
@@ -281,6 +327,7 @@ def toggle_category_status(id):
     category = ExpenseCategory.query.get_or_404(id)
     category.is_active = not category.is_active
     db.session.commit()
+    bump_lookup_version()
     
     status = 'activated' if category.is_active else 'deactivated'
     flash(f'Category "{category.name}" {status} successfully!', 'success')
@@ -310,39 +357,39 @@ def tradeshows():
 def system_logs():
     # This would typically show system logs, audit trails, etc.
     # For now, we'll show recent activities
-    recent_activities = []
+    recent_users = db.select(
+        db.literal('user').label('type'),
+        User.created_at.label('timestamp'),
+        User.username.label('name')
+    ).order_by(User.created_at.desc()).limit(5).subquery()
     
-    # Recent user creations
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    for user in recent_users:
-        recent_activities.append({
-            'timestamp': user.created_at,
-            'action': 'User Created',
-            'details': f'User "{user.username}" was created',
-            'type': 'user'
-        })
+    recent_tradeshows = db.select(
+        db.literal('tradeshow').label('type'),
+        TradeShow.created_at.label('timestamp'),
+        TradeShow.name.label('name')
+    ).order_by(TradeShow.created_at.desc()).limit(5).subquery()
     
-    # Recent trade shows
-    recent_tradeshows = TradeShow.query.order_by(TradeShow.created_at.desc()).limit(5).all()
-    for ts in recent_tradeshows:
-        recent_activities.append({
-            'timestamp': ts.created_at,
-            'action': 'Trade Show Created',
-            'details': f'Trade show "{ts.name}" was created',
-            'type': 'tradeshow'
-        })
+    recent_expenses = db.select(
+        db.literal('expense').label('type'),
+        Expense.created_at.label('timestamp'),
+        Expense.title.label('name')
+    ).order_by(Expense.created_at.desc()).limit(10).subquery()
     
-    # Recent expenses
-    recent_expenses = Expense.query.order_by(Expense.created_at.desc()).limit(10).all()
-    for expense in recent_expenses:
-        recent_activities.append({
-            'timestamp': expense.created_at,
-            'action': 'Expense Submitted',
-            'details': f'Expense "{expense.title}" was submitted',
-            'type': 'expense'
-        })
+    # Merge and sort in one round-trip
+    activity = db.union_all(
+        db.select(*recent_users.c),
+        db.select(*recent_tradeshows.c),
+        db.select(*recent_expenses.c)
+    ).subquery()
+    rows = db.session.execute(
+        db.select(*activity.c).order_by(activity.c.timestamp.desc()).limit(20)
+    ).all()
     
-    # Sort by timestamp
-    recent_activities.sort(key=lambda x: x['timestamp'], reverse=True)
+    recent_activities = [{
+        'timestamp': row.timestamp,
+        'action': SYSTEM_LOG_ACTIONS[row.type],
+        'details': SYSTEM_LOG_DETAILS[row.type].format(name=row.name),
+        'type': row.type
+    } for row in rows]
     
-    return render_template('admin/system_logs.html', activities=recent_activities[:20])
\ No newline at end of file
+    return render_template('admin/system_logs.html', activities=recent_activities)
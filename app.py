@@ -1,6 +1,6 @@
 from flask import Flask, render_template, redirect, url_for, flash, session, request
 from flask_login import LoginManager, login_required, current_user
-from werkzeug.security import generate_password_hash
+from sqlalchemy.orm import load_only
 from datetime import datetime
 import os
 
@@ -22,10 +22,14 @@ def inject_version():
     return {'app_version': get_version_info()}
 
 # Initialize database and login manager
-from models import db, User, Company, TradeShow, Expense, Receipt, TradeShowAssignment, ExpenseCategory, create_default_categories
+from models import db, User, Company, TradeShow, Expense, Receipt, TradeShowAssignment, ExpenseCategory, create_default_categories, insert_missing
 
 db.init_app(app)
 
+from utils import cache, hash_password, register_report_cache_events
+cache.init_app(app)
+register_report_cache_events()
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
@@ -33,7 +37,11 @@ login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Flask-Login keeps the result on g for the rest of the request, so this runs
+    # once per request; only fetch the columns the layout and role checks read
+    return db.session.get(User, int(user_id), options=[
+        load_only(User.id, User.username, User.full_name, User.role, User.is_active)
+    ])
 
 # Import blueprints
 from auth import auth_bp
@@ -49,18 +57,19 @@ app.register_blueprint(attendee_bp, url_prefix='/attendee')
 app.register_blueprint(accounting_bp, url_prefix='/accounting')
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
+# Landing dashboard for each role; anything else is treated as an attendee
+ROLE_DASHBOARDS = {
+    'admin': 'admin.dashboard',
+    'coordinator': 'coordinator.dashboard',
+    'accounting': 'accounting.dashboard',
+    'attendee': 'attendee.dashboard'
+}
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
         # Redirect based on user role
-        if current_user.role == 'admin':
-            return redirect(url_for('admin.dashboard'))
-        elif current_user.role == 'coordinator':
-            return redirect(url_for('coordinator.dashboard'))
-        elif current_user.role == 'accounting':
-            return redirect(url_for('accounting.dashboard'))
-        else:  # attendee
-            return redirect(url_for('attendee.dashboard'))
+        return redirect(url_for(ROLE_DASHBOARDS.get(current_user.role, 'attendee.dashboard')))
     return redirect(url_for('auth.login'))
 
 def create_default_data():
@@ -73,17 +82,14 @@ def create_default_data():
         'Nirvana Kulture'
     ]
     
-    for company_name in companies:
-        if not Company.query.filter_by(name=company_name).first():
-            company = Company(name=company_name)
-            db.session.add(company)
+    insert_missing(Company, [{'name': company_name} for company_name in companies])
     
-    # Create default admin user
+    # Create default admin user (checked first so the password is only hashed once)
     if not User.query.filter_by(username='admin').first():
         admin_user = User(
             username='admin',
             email='admin@company.com',
-            password_hash=generate_password_hash('admin123'),
+            password_hash=hash_password('admin123'),
             full_name='System Administrator',
             role='admin',
             is_active=True
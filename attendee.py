@@ -1,28 +1,64 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from datetime import datetime, date
+from datetime import date
 from decimal import Decimal
 import os
 import uuid
-from models import db, TradeShow, TradeShowAssignment, Expense, ExpenseCategory, Receipt, Company
-from utils import attendee_required, allowed_file, process_receipt_ocr, upload_to_zoho_workdrive
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload, joinedload, load_only
+from models import db, TradeShow, TradeShowAssignment, Expense, Receipt
+from utils import parse_iso_date, get_active_categories, attendee_required, split_ext, process_receipt_ocr, process_receipt, enqueue_receipt_processing
 
 attendee_bp = Blueprint('attendee', __name__)
 
+def _get_assignment(tradeshow_id):
+    """
+    The current user's assignment to a trade show, or 404
+    Loads only the columns the views use, with the trade show joined in
+    """
+    return TradeShowAssignment.query.options(
+        load_only(TradeShowAssignment.id, TradeShowAssignment.tradeshow_id, TradeShowAssignment.role_in_show),
+        joinedload(TradeShowAssignment.tradeshow)
+    ).filter_by(tradeshow_id=tradeshow_id, user_id=current_user.id).first_or_404()
+
+def _queue_receipt(receipt):
+    """Hand a saved receipt to the worker, processing it here if the queue is unreachable"""
+    # Identity key survives the commit, so this doesn't reload the receipt
+    receipt_id = inspect(receipt).identity[0]
+    try:
+        enqueue_receipt_processing(receipt_id)
+        return
+    except Exception as e:
+        current_app.logger.error(f"Could not queue receipt {receipt_id}, processing inline: {str(e)}")
+    
+    try:
+        process_receipt(receipt)
+    except Exception as e:
+        db.session.rollback()
+        receipt.status = 'failed'
+        current_app.logger.error(f"Receipt processing failed for receipt {receipt_id}: {str(e)}")
+    db.session.commit()
+
 @attendee_bp.route('/dashboard')
 @login_required
 @attendee_required
 def dashboard():
     # Get trade shows this user is assigned to
-    assignments = TradeShowAssignment.query.filter_by(user_id=current_user.id).all()
+    assignments = TradeShowAssignment.query.options(
+        selectinload(TradeShowAssignment.tradeshow)
+    ).filter_by(user_id=current_user.id).all()
     
     # Get user's expenses
-    user_expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.created_at.desc()).limit(10).all()
+    user_expenses = Expense.query.options(
+        selectinload(Expense.tradeshow)
+    ).filter_by(user_id=current_user.id).order_by(Expense.created_at.desc()).limit(10).all()
     
-    # Calculate statistics
-    total_expenses = db.session.query(db.func.sum(Expense.amount)).filter_by(user_id=current_user.id).scalar() or 0
-    pending_expenses = Expense.query.filter_by(user_id=current_user.id, status='pending').count()
+    # Calculate statistics in a single pass over the user's expenses
+    total_expenses, pending_expenses = db.session.query(
+        db.func.coalesce(db.func.sum(Expense.amount), 0),
+        db.func.count().filter(Expense.status == 'pending')
+    ).filter(Expense.user_id == current_user.id).one()
     
     return render_template('attendee/dashboard.html', 
                          assignments=assignments,
@@ -34,7 +70,9 @@ def dashboard():
 @login_required
 @attendee_required
 def my_tradeshows():
-    assignments = TradeShowAssignment.query.filter_by(user_id=current_user.id).all()
+    assignments = TradeShowAssignment.query.options(
+        selectinload(TradeShowAssignment.tradeshow)
+    ).filter_by(user_id=current_user.id).all()
     return render_template('attendee/my_tradeshows.html', assignments=assignments)
 
 @attendee_bp.route('/tradeshows/<int:id>/expenses')
@@ -42,9 +80,12 @@ def my_tradeshows():
 @attendee_required
 def tradeshow_expenses(id):
     # Verify user is assigned to this trade show
-    assignment = TradeShowAssignment.query.filter_by(tradeshow_id=id, user_id=current_user.id).first_or_404()
+    assignment = _get_assignment(id)
     
-    expenses = Expense.query.filter_by(tradeshow_id=id, user_id=current_user.id).order_by(Expense.created_at.desc()).all()
+    expenses = Expense.query.options(
+        selectinload(Expense.category),
+        selectinload(Expense.receipt)
+    ).filter_by(tradeshow_id=id, user_id=current_user.id).order_by(Expense.created_at.desc()).all()
     
     return render_template('attendee/tradeshow_expenses.html', 
                          assignment=assignment,
@@ -55,7 +96,7 @@ def tradeshow_expenses(id):
 @attendee_required
 def submit_expense(id):
     # Verify user is assigned to this trade show
-    assignment = TradeShowAssignment.query.filter_by(tradeshow_id=id, user_id=current_user.id).first_or_404()
+    assignment = _get_assignment(id)
     
     if request.method == 'POST':
         title = request.form.get('title')
@@ -66,41 +107,36 @@ def submit_expense(id):
         
         # Handle receipt upload
         receipt_file = request.files.get('receipt')
-        receipt_id = None
+        receipt = None
+        receipt_ok, receipt_ext = split_ext(receipt_file.filename) if receipt_file else (False, None)
         
-        if receipt_file and receipt_file.filename != '' and allowed_file(receipt_file.filename):
+        if receipt_ok:
             try:
-                # Generate unique filename
-                filename = str(uuid.uuid4()) + '.' + receipt_file.filename.rsplit('.', 1)[1].lower()
-                file_path = os.path.join('uploads', filename)
-                receipt_file.save(file_path)
-                
-                # Process OCR
-                ocr_results = process_receipt_ocr(file_path)
+                # Read the upload once; OCR works from these bytes
+                data = receipt_file.read()
                 
-                # Upload to Zoho WorkDrive
-                zoho_file_info = upload_to_zoho_workdrive(file_path, receipt_file.filename)
+                # Generate unique filename
+                filename = f'{uuid.uuid4().hex}.{receipt_ext}'
+                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+                with open(file_path, 'wb') as f:
+                    f.write(data)
                 
                 # Create receipt record
                 receipt = Receipt(
                     filename=filename,
                     original_filename=receipt_file.filename,
                     file_path=file_path,
-                    file_size=os.path.getsize(file_path),
+                    file_size=len(data),
                     mime_type=receipt_file.mimetype,
-                    ocr_text=ocr_results.get('text', ''),
-                    ocr_confidence=ocr_results.get('confidence', 0),
-                    extracted_amount=ocr_results.get('amount'),
-                    extracted_date=ocr_results.get('date'),
-                    extracted_merchant=ocr_results.get('merchant'),
-                    zoho_file_id=zoho_file_info.get('file_id'),
-                    zoho_file_url=zoho_file_info.get('download_url'),
                     uploaded_by=current_user.id
                 )
                 
-                db.session.add(receipt)
-                db.session.flush()  # Get the receipt ID
-                receipt_id = receipt.id
+                if current_app.config['RECEIPT_QUEUE']:
+                    # OCR and the WorkDrive upload run in a worker once the expense is saved
+                    receipt.status = 'processing'
+                else:
+                    # Process OCR and upload to Zoho WorkDrive
+                    process_receipt(receipt, data)
                 
                 # Use OCR data to pre-fill if not provided
                 if not amount and receipt.extracted_amount:
@@ -114,14 +150,16 @@ def submit_expense(id):
                 flash(f'Error processing receipt: {str(e)}', 'error')
                 return render_template('attendee/submit_expense.html', 
                                      assignment=assignment,
-                                     categories=ExpenseCategory.query.filter_by(is_active=True).all())
+                                     categories=get_active_categories())
+        
+        expense_date = parse_iso_date(expense_date)
         
         # Validate required fields
         if not all([title, amount, expense_date, category_id]):
             flash('Please fill in all required fields.', 'error')
             return render_template('attendee/submit_expense.html', 
                                  assignment=assignment,
-                                 categories=ExpenseCategory.query.filter_by(is_active=True).all())
+                                 categories=get_active_categories())
         
         try:
             expense = Expense(
@@ -130,23 +168,28 @@ def submit_expense(id):
                 title=title,
                 description=description,
                 amount=Decimal(amount),
-                expense_date=datetime.strptime(expense_date, '%Y-%m-%d').date(),
+                expense_date=expense_date,
                 category_id=category_id,
-                receipt_id=receipt_id,
+                receipt=receipt,
                 status='pending'
             )
             
+            # The unit of work inserts the receipt before the expense that references it
             db.session.add(expense)
             db.session.commit()
             
-            flash(f'Expense "{title}" submitted successfully!', 'success')
-            return redirect(url_for('attendee.tradeshow_expenses', id=id))
-            
         except Exception as e:
             db.session.rollback()
             flash(f'Error submitting expense: {str(e)}', 'error')
+        else:
+            # The expense is saved whatever happens to the receipt job
+            if receipt is not None and current_app.config['RECEIPT_QUEUE']:
+                _queue_receipt(receipt)
+            
+            flash(f'Expense "{title}" submitted successfully!', 'success')
+            return redirect(url_for('attendee.tradeshow_expenses', id=id))
     
-    categories = ExpenseCategory.query.filter_by(is_active=True).all()
+    categories = get_active_categories()
     return render_template('attendee/submit_expense.html', 
                          assignment=assignment,
                          categories=categories)
@@ -156,7 +199,10 @@ def submit_expense(id):
 @attendee_required
 def all_expenses():
     page = request.args.get('page', 1, type=int)
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.created_at.desc()).paginate(
+    expenses = Expense.query.options(
+        selectinload(Expense.tradeshow),
+        selectinload(Expense.category)
+    ).filter_by(user_id=current_user.id).order_by(Expense.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False)
     return render_template('attendee/all_expenses.html', expenses=expenses)
 
@@ -167,6 +213,20 @@ def expense_detail(id):
     expense = Expense.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     return render_template('attendee/expense_detail.html', expense=expense)
 
+@attendee_bp.route('/receipts/<int:id>/status')
+@login_required
+@attendee_required
+def receipt_status(id):
+    """AJAX endpoint for polling background receipt processing"""
+    receipt = Receipt.query.filter_by(id=id, uploaded_by=current_user.id).first_or_404()
+    return jsonify({
+        'status': receipt.status,
+        'amount': str(receipt.extracted_amount or ''),
+        'date': receipt.extracted_date.strftime('%Y-%m-%d') if receipt.extracted_date else '',
+        'merchant': receipt.extracted_merchant or '',
+        'confidence': receipt.ocr_confidence or 0
+    })
+
 @attendee_bp.route('/receipt-scan', methods=['POST'])
 @login_required
 @attendee_required
@@ -176,21 +236,12 @@ def scan_receipt():
         return jsonify({'error': 'No file uploaded'}), 400
     
     file = request.files['receipt']
-    if file.filename == '' or not allowed_file(file.filename):
+    if not split_ext(file.filename)[0]:
         return jsonify({'error': 'Invalid file type'}), 400
     
     try:
-        # Save file temporarily
-        filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-        temp_path = os.path.join('temp', filename)
-        os.makedirs('temp', exist_ok=True)
-        file.save(temp_path)
-        
-        # Process OCR
-        ocr_results = process_receipt_ocr(temp_path)
-        
-        # Clean up temp file
-        os.remove(temp_path)
+        # Process OCR straight from the upload, no temp file
+        ocr_results = process_receipt_ocr(file.read())
         
         return jsonify({
             'success': True,
@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from datetime import datetime, date
+from datetime import date
 from decimal import Decimal
-from models import db, TradeShow, User, TradeShowAssignment, Expense, ExpenseCategory, Company
-from utils import coordinator_required
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from models import db, TradeShow, User, TradeShowAssignment, Expense
+from utils import parse_iso_date, get_active_categories, get_active_companies, coordinator_required, bump_lookup_version
 
 coordinator_bp = Blueprint('coordinator', __name__)
 
@@ -41,8 +43,8 @@ def create_tradeshow():
     if request.method == 'POST':
         name = request.form.get('name')
         description = request.form.get('description', '')
-        start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+        start_date = parse_iso_date(request.form.get('start_date'))
+        end_date = parse_iso_date(request.form.get('end_date'))
         location = request.form.get('location')
         
         if not all([name, start_date, end_date, location]):
@@ -64,6 +66,7 @@ def create_tradeshow():
         
         db.session.add(tradeshow)
         db.session.commit()
+        bump_lookup_version()
         
         flash(f'Trade show "{name}" created successfully!', 'success')
         return redirect(url_for('coordinator.tradeshow_detail', id=tradeshow.id))
@@ -75,11 +78,20 @@ def create_tradeshow():
 @coordinator_required
 def tradeshow_detail(id):
     tradeshow = TradeShow.query.filter_by(id=id, created_by=current_user.id).first_or_404()
-    assignments = TradeShowAssignment.query.filter_by(tradeshow_id=id).all()
-    expenses = Expense.query.filter_by(tradeshow_id=id).all()
+    assignments = TradeShowAssignment.query.options(
+        selectinload(TradeShowAssignment.user)
+    ).filter_by(tradeshow_id=id).all()
+    page = request.args.get('page', 1, type=int)
+    expenses = Expense.query.options(
+        selectinload(Expense.user),
+        selectinload(Expense.category)
+    ).filter_by(tradeshow_id=id).order_by(Expense.created_at.desc()).paginate(
+        page=page, per_page=50, error_out=False)
     
-    # Calculate total expenses
-    total_expenses = sum(expense.amount for expense in expenses)
+    # Calculate total expenses across all pages
+    total_expenses = db.session.query(
+        db.func.coalesce(db.func.sum(Expense.amount), 0)
+    ).filter(Expense.tradeshow_id == id).scalar()
     
     return render_template('coordinator/tradeshow_detail.html', 
                          tradeshow=tradeshow, 
@@ -100,28 +112,39 @@ def manage_attendees(id):
         hotel_details = request.form.get('hotel_details', '')
         notes = request.form.get('notes', '')
         
-        # Check if user is already assigned to this trade show
-        existing_assignment = TradeShowAssignment.query.filter_by(
-            user_id=user_id, tradeshow_id=id).first()
+        assignment = TradeShowAssignment(
+            user_id=user_id,
+            tradeshow_id=id,
+            role_in_show=role_in_show,
+            flight_details=flight_details,
+            hotel_details=hotel_details,
+            notes=notes
+        )
+        db.session.add(assignment)
         
-        if existing_assignment:
-            flash('User is already assigned to this trade show.', 'warning')
-        else:
-            assignment = TradeShowAssignment(
-                user_id=user_id,
-                tradeshow_id=id,
-                role_in_show=role_in_show,
-                flight_details=flight_details,
-                hotel_details=hotel_details,
-                notes=notes
-            )
-            db.session.add(assignment)
+        # unique_user_tradeshow rejects duplicate assignments
+        try:
             db.session.commit()
             flash('Attendee added successfully!', 'success')
+        except IntegrityError:
+            db.session.rollback()
+            already_assigned = db.session.query(
+                TradeShowAssignment.query.filter_by(tradeshow_id=id, user_id=user_id).exists()
+            ).scalar()
+            if already_assigned:
+                flash('User is already assigned to this trade show.', 'warning')
+            else:
+                # Some other constraint failed, e.g. an unknown user_id
+                current_app.logger.exception(f'Could not assign user {user_id} to trade show {id}')
+                flash('Could not add attendee. Please check the details and try again.', 'error')
     
-    # Get available users (attendees and other coordinators)
-    available_users = User.query.filter(User.role.in_(['attendee', 'coordinator']), User.is_active == True).all()
-    current_assignments = TradeShowAssignment.query.filter_by(tradeshow_id=id).all()
+    # Get available users (attendees and other coordinators) as lightweight rows for the dropdown
+    available_users = db.session.query(
+        User.id, User.username, User.full_name, User.email, User.role
+    ).filter(User.role.in_(['attendee', 'coordinator']), User.is_active == True).order_by(User.full_name).all()
+    current_assignments = TradeShowAssignment.query.options(
+        selectinload(TradeShowAssignment.user)
+    ).filter_by(tradeshow_id=id).all()
     
     return render_template('coordinator/manage_attendees.html', 
                          tradeshow=tradeshow,
@@ -138,10 +161,14 @@ def manage_expenses(id):
         title = request.form.get('title')
         description = request.form.get('description', '')
         amount = Decimal(request.form.get('amount'))
-        expense_date = datetime.strptime(request.form.get('expense_date'), '%Y-%m-%d').date()
+        expense_date = parse_iso_date(request.form.get('expense_date'))
         category_id = request.form.get('category_id')
         company_id = request.form.get('company_id')
         
+        if not expense_date:
+            flash('Please enter a valid expense date.', 'error')
+            return redirect(url_for('coordinator.manage_expenses', id=id))
+        
         expense = Expense(
             tradeshow_id=id,
             user_id=current_user.id,
@@ -160,9 +187,12 @@ def manage_expenses(id):
         flash(f'Expense "{title}" added successfully!', 'success')
         return redirect(url_for('coordinator.manage_expenses', id=id))
     
-    categories = ExpenseCategory.query.filter_by(is_active=True).all()
-    companies = Company.query.filter_by(is_active=True).all()
-    expenses = Expense.query.filter_by(tradeshow_id=id).all()
+    categories = get_active_categories()
+    companies = get_active_companies()
+    expenses = Expense.query.options(
+        selectinload(Expense.user),
+        selectinload(Expense.category)
+    ).filter_by(tradeshow_id=id).all()
     
     return render_template('coordinator/manage_expenses.html', 
                          tradeshow=tradeshow,
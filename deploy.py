@@ -51,6 +51,40 @@ def setup_database():
         print(f"❌ Database setup failed: {e}")
         return False
 
+# Columns added after the first release; create_all() leaves existing tables alone
+ADDED_COLUMNS = [
+    ('receipt', 'status', "VARCHAR(20) DEFAULT 'processed'"),
+]
+
+# String columns widened after the first release; only PostgreSQL enforces the length
+WIDENED_COLUMNS = [
+    ('user', 'password_hash', 255),  # scrypt hashes are ~162 characters
+]
+
+def upgrade_database():
+    """Bring an existing database up to the current schema"""
+    print("\n🔧 Upgrading database schema...")
+    try:
+        from app import app, db
+        with app.app_context():
+            inspector = db.inspect(db.engine)
+            with db.engine.begin() as conn:
+                for table, column, ddl in ADDED_COLUMNS:
+                    if column not in {c['name'] for c in inspector.get_columns(table)}:
+                        conn.execute(db.text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+                        print(f"✅ Added column: {table}.{column}")
+                if db.engine.dialect.name == 'postgresql':
+                    for table, column, length in WIDENED_COLUMNS:
+                        current = {c['name']: c['type'] for c in inspector.get_columns(table)}[column]
+                        if current.length is not None and current.length < length:
+                            conn.execute(db.text(f'ALTER TABLE "{table}" ALTER COLUMN {column} TYPE VARCHAR({length})'))
+                            print(f"✅ Widened column: {table}.{column} to {length}")
+        print("✅ Database schema is up to date")
+        return True
+    except Exception as e:
+        print(f"❌ Database upgrade failed: {e}")
+        return False
+
 def check_config():
     """Check if configuration is properly set"""
     print("\n⚙️ Checking configuration...")
@@ -137,6 +171,8 @@ def main():
     
     if not setup_database():
         print("\n💡 You may need to set up the database manually")
+    elif not upgrade_database():
+        print("\n💡 Apply the column changes in DEPLOYMENT_GUIDE.md by hand")
     
     check_config()
     create_wsgi_file()
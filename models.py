@@ -1,22 +1,66 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 
 db = SQLAlchemy()
 
+# Trigram indexes below need pg_trgm; other backends skip them
+db.event.listen(
+    db.metadata,
+    'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+class utcnow(FunctionElement):
+    """Database-side UTC timestamp with sub-second precision"""
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    # Six fractional digits, the same text SQLAlchemy binds for SQLite datetimes,
+    # so keyset cursors compare equal to the stored value
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))  # scrypt hashes are ~162 characters
     full_name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # admin, coordinator, accounting, attendee
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
     
     # Relationships
-    assignments = db.relationship('TradeShowAssignment', backref='user', lazy='dynamic')
-    expenses = db.relationship('Expense', backref='user', lazy='dynamic')
+    assignments = db.relationship('TradeShowAssignment', back_populates='user')
+    expenses = db.relationship('Expense', back_populates='user', foreign_keys='Expense.user_id')
+    approved_expenses = db.relationship('Expense', back_populates='approver', foreign_keys='Expense.approved_by')
+    created_tradeshows = db.relationship('TradeShow', back_populates='creator')
+    uploaded_receipts = db.relationship('Receipt', back_populates='uploader')
+    
+    __table_args__ = (
+        db.Index('ix_user_role_active', 'role', 'is_active'),
+        # Let the admin search's LIKE '%q%' filters use an index on PostgreSQL
+        db.Index('ix_user_username_trgm', 'username',
+                 postgresql_using='gin',
+                 postgresql_ops={'username': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_user_email_trgm', 'email',
+                 postgresql_using='gin',
+                 postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_user_full_name_trgm', 'full_name',
+                 postgresql_using='gin',
+                 postgresql_ops={'full_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
 class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,10 +69,10 @@ class Company(db.Model):
     zoho_access_token = db.Column(db.Text)   # Zoho API access token
     zoho_refresh_token = db.Column(db.Text)  # Zoho API refresh token
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
     
     # Relationships
-    expenses = db.relationship('Expense', backref='company', lazy='dynamic')
+    expenses = db.relationship('Expense', back_populates='company')
 
 class TradeShow(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -39,22 +83,27 @@ class TradeShow(db.Model):
     location = db.Column(db.String(200), nullable=False)
     status = db.Column(db.String(20), default='planning')  # planning, active, completed, cancelled
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
     
     # Relationships
-    assignments = db.relationship('TradeShowAssignment', backref='tradeshow', lazy='dynamic')
-    expenses = db.relationship('Expense', backref='tradeshow', lazy='dynamic')
-    creator = db.relationship('User', backref='created_tradeshows')
+    assignments = db.relationship('TradeShowAssignment', back_populates='tradeshow')
+    expenses = db.relationship('Expense', back_populates='tradeshow')
+    creator = db.relationship('User', back_populates='created_tradeshows')
 
 class TradeShowAssignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    tradeshow_id = db.Column(db.Integer, db.ForeignKey('trade_show.id'), nullable=False)
+    # Own index: the (user_id, tradeshow_id) unique constraint can't serve per-show lookups
+    tradeshow_id = db.Column(db.Integer, db.ForeignKey('trade_show.id'), nullable=False, index=True)
     role_in_show = db.Column(db.String(50))  # attendee, coordinator, etc.
     flight_details = db.Column(db.Text)
     hotel_details = db.Column(db.Text)
     notes = db.Column(db.Text)
-    assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
+    assigned_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
+    
+    # Relationships
+    user = db.relationship('User', back_populates='assignments')
+    tradeshow = db.relationship('TradeShow', back_populates='assignments')
     
     __table_args__ = (db.UniqueConstraint('user_id', 'tradeshow_id', name='unique_user_tradeshow'),)
 
@@ -65,7 +114,7 @@ class ExpenseCategory(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
-    expenses = db.relationship('Expense', backref='category', lazy='dynamic')
+    expenses = db.relationship('Expense', back_populates='category')
 
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -77,7 +126,7 @@ class Expense(db.Model):
     # Expense details
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    amount = db.Column(db.Decimal(10, 2), nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), default='USD')
     expense_date = db.Column(db.Date, nullable=False)
     
@@ -85,7 +134,7 @@ class Expense(db.Model):
     receipt_id = db.Column(db.Integer, db.ForeignKey('receipt.id'))
     
     # Approval and processing
-    status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, processed
+    status = db.Column(db.String(20), default='pending')  # pending, approved, pushing, rejected, processed
     approved_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     approved_at = db.Column(db.DateTime)
     
@@ -94,11 +143,32 @@ class Expense(db.Model):
     pushed_to_zoho = db.Column(db.Boolean, default=False)
     zoho_push_date = db.Column(db.DateTime)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
+    updated_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow())
     
     # Relationships
-    approver = db.relationship('User', foreign_keys=[approved_by], backref='approved_expenses')
+    user = db.relationship('User', foreign_keys=[user_id], back_populates='expenses')
+    approver = db.relationship('User', foreign_keys=[approved_by], back_populates='approved_expenses')
+    company = db.relationship('Company', back_populates='expenses')
+    tradeshow = db.relationship('TradeShow', back_populates='expenses')
+    category = db.relationship('ExpenseCategory', back_populates='expenses')
+    receipt = db.relationship('Receipt', back_populates='expenses')
+    
+    # Indexes matching the accounting list filters and dashboard counts,
+    # the report filters (show/company plus an expense_date range),
+    # plus the per-user lookups in the attendee and coordinator views
+    __table_args__ = (
+        db.Index('ix_expense_status_created', 'status', 'created_at'),
+        db.Index('ix_expense_status_pushed', 'status', 'pushed_to_zoho'),
+        db.Index('ix_expense_tradeshow_created', 'tradeshow_id', 'created_at'),
+        db.Index('ix_expense_company_created', 'company_id', 'created_at'),
+        db.Index('ix_expense_tradeshow_date', 'tradeshow_id', 'expense_date'),
+        db.Index('ix_expense_company_date', 'company_id', 'expense_date'),
+        db.Index('ix_expense_expense_date_status', 'expense_date', 'status'),
+        db.Index('ix_expense_user_created', 'user_id', 'created_at'),
+        db.Index('ix_expense_tradeshow_user', 'tradeshow_id', 'user_id'),
+        db.Index('ix_expense_user_status', 'user_id', 'status'),
+    )
 
 class Receipt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -111,7 +181,7 @@ class Receipt(db.Model):
     # OCR results
     ocr_text = db.Column(db.Text)
     ocr_confidence = db.Column(db.Float)
-    extracted_amount = db.Column(db.Decimal(10, 2))
+    extracted_amount = db.Column(db.Numeric(10, 2))
     extracted_date = db.Column(db.Date)
     extracted_merchant = db.Column(db.String(200))
     
@@ -119,12 +189,84 @@ class Receipt(db.Model):
     zoho_file_id = db.Column(db.String(100))  # File ID in Zoho WorkDrive
     zoho_file_url = db.Column(db.String(500))  # Download URL from Zoho WorkDrive
     
-    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    uploaded_at = db.Column(db.DateTime, default=utcnow(), server_default=utcnow())
+    status = db.Column(db.String(20), default='processed')  # processing, processed, failed
     
     # Relationships
-    uploader = db.relationship('User', backref='uploaded_receipts')
-    expenses = db.relationship('Expense', backref='receipt', lazy='dynamic')
+    uploader = db.relationship('User', back_populates='uploaded_receipts')
+    expenses = db.relationship('Expense', back_populates='receipt')
+
+def insert_missing(model, rows):
+    """
+    Insert rows, skipping any that clash with an existing unique key
+    Uses a single INSERT ... ON CONFLICT DO NOTHING on PostgreSQL and SQLite
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        # Portable fallback: one lookup on the first key, then one insert
+        key = next(iter(rows[0]))
+        column = getattr(model, key)
+        existing = {value for (value,) in db.session.query(column).filter(column.in_([row[key] for row in rows]))}
+        rows = [row for row in rows if row[key] not in existing]
+        if rows:
+            db.session.execute(db.insert(model), rows)
+        return
+    
+    db.session.execute(insert(model).on_conflict_do_nothing(), rows)
+
+# Pre-aggregated processed expense totals behind /api/expense-stats (PostgreSQL only)
+# Declared on its own MetaData so create_all() does not treat it as a table
+monthly_expense_view = db.Table(
+    'mv_monthly_expense', db.MetaData(),
+    db.Column('month', db.Date),
+    db.Column('category_id', db.Integer),
+    db.Column('company_id', db.Integer),
+    db.Column('total', db.Numeric(12, 2))
+)
+
+db.event.listen(
+    db.metadata,
+    'after_create',
+    db.DDL("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_monthly_expense AS
+        SELECT date_trunc('month', expense_date)::date AS month,
+               category_id,
+               company_id,
+               SUM(amount) AS total
+        FROM expense
+        WHERE status = 'processed'
+        GROUP BY 1, 2, 3
+    """).execute_if(dialect='postgresql')
+)
+# REFRESH ... CONCURRENTLY requires a unique index on the view
+db.event.listen(
+    db.metadata,
+    'after_create',
+    db.DDL(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_mv_monthly_expense '
+        'ON mv_monthly_expense (month, category_id, company_id)'
+    ).execute_if(dialect='postgresql')
+)
+db.event.listen(
+    db.metadata,
+    'before_drop',
+    db.DDL('DROP MATERIALIZED VIEW IF EXISTS mv_monthly_expense').execute_if(dialect='postgresql')
+)
+
+def use_monthly_expense_view():
+    """Whether the database backs mv_monthly_expense"""
+    return db.engine.dialect.name == 'postgresql'
+
+def refresh_monthly_expense_view():
+    """Recompute mv_monthly_expense; call after expenses move to processed"""
+    if use_monthly_expense_view():
+        db.session.execute(db.text('REFRESH MATERIALIZED VIEW CONCURRENTLY mv_monthly_expense'))
+        db.session.commit()
 
 # Seed data for expense categories
 def create_default_categories():
@@ -142,9 +284,7 @@ def create_default_categories():
         ('Miscellaneous', 'Other trade show related expenses')
     ]
     
-    for name, description in default_categories:
-        if not ExpenseCategory.query.filter_by(name=name).first():
-            category = ExpenseCategory(name=name, description=description)
-            db.session.add(category)
-    
+    insert_missing(ExpenseCategory, [
+        {'name': name, 'description': description} for name, description in default_categories
+    ])
     db.session.commit()
\ No newline at end of file
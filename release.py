@@ -9,14 +9,14 @@ import sys
 import subprocess
 import argparse
 from pathlib import Path
-from version import version_manager, get_version_info
+from version import version_manager, get_version, get_version_info
 
 def run_command(command, cwd=None):
-    """Run shell command and return result"""
+    """Run a command given as an argument list (no shell) and return result"""
     try:
         result = subprocess.run(
             command, 
-            shell=True, 
+            shell=False, 
             cwd=cwd or os.getcwd(),
             capture_output=True,
             text=True,
@@ -24,15 +24,18 @@ def run_command(command, cwd=None):
         )
         return result.stdout.strip(), result.stderr.strip()
     except subprocess.CalledProcessError as e:
-        print(f"❌ Command failed: {command}")
+        print(f"❌ Command failed: {' '.join(command)}")
         print(f"Error: {e.stderr}")
         return None, e.stderr
+    except FileNotFoundError as e:
+        print(f"❌ Command not found: {command[0]}")
+        return None, str(e)
 
 def check_git_status():
     """Check if git repository is clean"""
     print("🔍 Checking git status...")
     
-    stdout, stderr = run_command("git status --porcelain")
+    stdout, stderr = run_command(["git", "status", "--porcelain"])
     if stdout is None:
         print("❌ Git not initialized or error checking status")
         return False
@@ -54,16 +57,16 @@ def setup_git_repository():
     # Check if git is already initialized
     if not Path('.git').exists():
         print("Initializing git repository...")
-        stdout, stderr = run_command("git init")
+        stdout, stderr = run_command(["git", "init"])
         if stdout is None:
             print("❌ Failed to initialize git repository")
             return False
     
     # Add remote origin
     print("Adding GitHub remote...")
-    stdout, stderr = run_command("git remote get-url origin")
+    stdout, stderr = run_command(["git", "remote", "get-url", "origin"])
     if stdout is None:
-        stdout, stderr = run_command("git remote add origin https://github.com/kidevu123/expenses.git")
+        stdout, stderr = run_command(["git", "remote", "add", "origin", "https://github.com/kidevu123/expenses.git"])
         if stdout is None:
             print("❌ Failed to add remote origin")
             return False
@@ -78,16 +81,15 @@ def commit_and_push(version_type, message=None):
     print(f"📝 Committing changes for {version_type} release...")
     
     # Add all files
-    stdout, stderr = run_command("git add .")
+    stdout, stderr = run_command(["git", "add", "."])
     if stdout is None:
         return False
     
-    # Get current version info
-    version_info = get_version_info()
-    commit_message = message or f"Release version {version_info['version']}"
+    # Default commit message names the new version
+    commit_message = message or f"Release version {get_version()}"
     
     # Commit changes
-    stdout, stderr = run_command(f'git commit -m "{commit_message}"')
+    stdout, stderr = run_command(["git", "commit", "-m", commit_message])
     if stdout is None and "nothing to commit" not in stderr:
         return False
     
@@ -96,17 +98,11 @@ def commit_and_push(version_type, message=None):
     if tag_name:
         print(f"✅ Created git tag: {tag_name}")
     
-    # Push to GitHub
+    # Push the branch and its release tag together; --atomic updates both or neither
     print("🚀 Pushing to GitHub...")
-    stdout, stderr = run_command("git push origin main")
-    if stdout is None:
-        print("❌ Failed to push to main branch")
-        return False
-    
-    # Push tags
-    stdout, stderr = run_command("git push origin --tags")
+    stdout, stderr = run_command(["git", "push", "--atomic", "--follow-tags", "origin", "main"])
     if stdout is None:
-        print("❌ Failed to push tags")
+        print("❌ Failed to push to main branch with tags")
         return False
     
     print("✅ Successfully pushed to GitHub with tags")
@@ -125,7 +121,7 @@ def create_release(version_type='patch', message=None):
         return False
     
     # Increment version
-    old_version = get_version_info()['version']
+    old_version = get_version()
     new_version = version_manager.increment_version(version_type)
     
     print(f"📈 Version incremented: {old_version} → {new_version}")
@@ -0,0 +1,88 @@
+"""
+Background jobs for Trade Show Expense Tracker
+Run a worker alongside the web app with: rq worker zoho receipts
+"""
+
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from app import app
+from models import db, Expense, Receipt, use_monthly_expense_view, refresh_monthly_expense_view
+from utils import push_expense_to_zoho, enqueue_monthly_view_refresh, process_receipt as run_receipt_processing
+from accounting import record_zoho_push, invalidate_expense_caches
+
+def push_expense(expense_id):
+    """Push an approved expense to Zoho Books and record the result"""
+    with app.app_context():
+        # Claim the expense with a conditional status change before calling Zoho,
+        # so a duplicate job on another worker can't create it there twice
+        claimed = db.session.execute(
+            update(Expense).where(
+                Expense.id == expense_id,
+                Expense.status == 'approved',
+                Expense.pushed_to_zoho == False,
+                Expense.company_id.isnot(None)
+            ).values(status='pushing')
+        ).rowcount
+        db.session.commit()
+        
+        # The expense may have changed since it was queued
+        if not claimed:
+            return {'success': False, 'error': 'Expense is no longer eligible for Zoho push'}
+        
+        # Everything the Zoho payload reads, loaded with the expense
+        expense = db.session.get(Expense, expense_id, options=[
+            joinedload(Expense.company),
+            joinedload(Expense.user),
+            joinedload(Expense.tradeshow),
+            joinedload(Expense.receipt)
+        ])
+        
+        try:
+            zoho_response = push_expense_to_zoho(expense)
+        except Exception:
+            _release_push_claim(expense)
+            raise
+        
+        if zoho_response.get('success'):
+            # A bulk push queues one job per expense; they share a single view refresh
+            record_zoho_push(expense, zoho_response, refresh_view=False)
+            if use_monthly_expense_view():
+                enqueue_monthly_view_refresh()
+        else:
+            _release_push_claim(expense)
+            app.logger.error(f"Queued Zoho push failed for expense {expense_id}: {zoho_response.get('error')}")
+        
+        return {'success': zoho_response.get('success', False), 'error': zoho_response.get('error')}
+
+def _release_push_claim(expense):
+    """Put a claimed expense back to approved so the push can be retried"""
+    db.session.rollback()
+    expense.status = 'approved'
+    db.session.commit()
+
+def refresh_monthly_view():
+    """Refresh the monthly expense view after queued Zoho pushes"""
+    with app.app_context():
+        refresh_monthly_expense_view()
+        # Stats cached between the push and this refresh still hold the old view
+        invalidate_expense_caches()
+        return {'success': True}
+
+def process_receipt(receipt_id):
+    """Run OCR and the WorkDrive upload for a receipt saved as 'processing'"""
+    with app.app_context():
+        receipt = db.session.get(Receipt, receipt_id)
+        if not receipt or receipt.status != 'processing':
+            return {'success': False, 'error': 'Receipt is not awaiting processing'}
+        
+        try:
+            run_receipt_processing(receipt)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            receipt.status = 'failed'
+            db.session.commit()
+            app.logger.error(f"Receipt processing failed for receipt {receipt_id}: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        
+        return {'success': True}
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+# Must be set before app is imported; app.py picks its config at import time
+os.environ['FLASK_ENV'] = 'testing'
+
+from app import app as flask_app, create_default_data
+from models import db
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        create_default_data()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def shared_cache(app):
+    """Swap the testing NullCache for a real in-process cache"""
+    from utils import cache
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    yield cache
+    cache.clear()
+    cache.init_app(app, config={'CACHE_TYPE': 'NullCache'})
+
+
+@pytest.fixture
+def admin_client(client):
+    from models import User
+    admin = User.query.filter_by(username='admin').one()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
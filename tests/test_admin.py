@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User
+import admin
+
+NEW_USER = {
+    'username': 'jdoe',
+    'email': 'jdoe@example.com',
+    'full_name': 'J Doe',
+    'role': 'attendee',
+    'password': 'secret123'
+}
+
+
+@pytest.fixture(autouse=True)
+def no_templates(monkeypatch):
+    monkeypatch.setattr(admin, 'render_template', lambda template, **context: template)
+
+
+def _flashes(client):
+    with client.session_transaction() as session:
+        return [message for category, message in session.get('_flashes', [])]
+
+
+def test_create_user_reports_duplicate_username(admin_client):
+    response = admin_client.post('/admin/users/create', data=dict(NEW_USER, username='admin'))
+
+    assert response.status_code == 200
+    assert _flashes(admin_client) == ['Username already exists.']
+
+
+def test_create_user_reports_other_integrity_errors_generically(admin_client, monkeypatch):
+    def failing_commit():
+        raise IntegrityError('INSERT INTO user', {}, Exception('NOT NULL constraint failed'))
+
+    monkeypatch.setattr(db.session, 'commit', failing_commit)
+
+    response = admin_client.post('/admin/users/create', data=NEW_USER)
+
+    assert response.status_code == 200
+    assert _flashes(admin_client) == ['Could not create user. Please check the details and try again.']
+    assert User.query.filter_by(username='jdoe').first() is None
@@ -0,0 +1,66 @@
+from datetime import date
+from io import BytesIO
+
+import pytest
+
+from models import db, Expense, ExpenseCategory, Receipt, TradeShow, TradeShowAssignment, User
+import attendee
+
+
+@pytest.fixture
+def tradeshow_id(app):
+    admin = User.query.filter_by(username='admin').one()
+    tradeshow = TradeShow(name='Expo', start_date=date(2024, 1, 1), end_date=date(2024, 1, 3),
+                          location='Las Vegas', created_by=admin.id)
+    db.session.add(tradeshow)
+    db.session.flush()
+    db.session.add(TradeShowAssignment(user_id=admin.id, tradeshow_id=tradeshow.id, role_in_show='attendee'))
+    db.session.commit()
+    return tradeshow.id
+
+
+@pytest.fixture
+def queue_down(app, monkeypatch, tmp_path):
+    def enqueue(receipt_id):
+        raise ConnectionError('redis is down')
+
+    monkeypatch.setitem(app.config, 'RECEIPT_QUEUE', True)
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(attendee, 'enqueue_receipt_processing', enqueue)
+
+
+def _submit(client, tradeshow_id):
+    return client.post(f'/attendee/tradeshows/{tradeshow_id}/submit-expense', data={
+        'title': 'Taxi',
+        'amount': '12.50',
+        'expense_date': '2024-01-02',
+        'category_id': ExpenseCategory.query.first().id,
+        'receipt': (BytesIO(b'receipt'), 'taxi.png')
+    }, content_type='multipart/form-data')
+
+
+def test_receipt_is_processed_inline_when_the_queue_is_down(admin_client, tradeshow_id, queue_down, monkeypatch):
+    def process(receipt, data=None):
+        receipt.status = 'processed'
+        return receipt
+
+    monkeypatch.setattr(attendee, 'process_receipt', process)
+
+    response = _submit(admin_client, tradeshow_id)
+
+    assert response.status_code == 302
+    assert Expense.query.one().title == 'Taxi'
+    assert Receipt.query.one().status == 'processed'
+
+
+def test_receipt_is_marked_failed_when_inline_processing_fails(admin_client, tradeshow_id, queue_down, monkeypatch):
+    def process(receipt, data=None):
+        raise RuntimeError('WorkDrive is down')
+
+    monkeypatch.setattr(attendee, 'process_receipt', process)
+
+    response = _submit(admin_client, tradeshow_id)
+
+    assert response.status_code == 302
+    assert Expense.query.one().title == 'Taxi'
+    assert Receipt.query.one().status == 'failed'
@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TradeShow, TradeShowAssignment, User
+import coordinator
+
+
+@pytest.fixture(autouse=True)
+def no_templates(monkeypatch):
+    monkeypatch.setattr(coordinator, 'render_template', lambda template, **context: template)
+
+
+@pytest.fixture
+def tradeshow_id(app):
+    admin = User.query.filter_by(username='admin').one()
+    tradeshow = TradeShow(name='Expo', start_date=date(2024, 1, 1), end_date=date(2024, 1, 3),
+                          location='Las Vegas', created_by=admin.id)
+    db.session.add(tradeshow)
+    db.session.commit()
+    return tradeshow.id
+
+
+def _flashes(client):
+    with client.session_transaction() as session:
+        return [message for category, message in session.pop('_flashes', [])]
+
+
+def _add_admin(client, tradeshow_id):
+    admin_id = User.query.filter_by(username='admin').one().id
+    return client.post(f'/coordinator/tradeshows/{tradeshow_id}/attendees', data={'user_id': admin_id})
+
+
+def test_manage_attendees_reports_duplicate_assignment(admin_client, tradeshow_id):
+    _add_admin(admin_client, tradeshow_id)
+    _flashes(admin_client)
+
+    _add_admin(admin_client, tradeshow_id)
+
+    assert _flashes(admin_client) == ['User is already assigned to this trade show.']
+    assert TradeShowAssignment.query.filter_by(tradeshow_id=tradeshow_id).count() == 1
+
+
+def test_manage_attendees_reports_other_integrity_errors_generically(admin_client, tradeshow_id, monkeypatch):
+    def failing_commit():
+        raise IntegrityError('INSERT INTO trade_show_assignment', {}, Exception('FOREIGN KEY constraint failed'))
+
+    monkeypatch.setattr(db.session, 'commit', failing_commit)
+
+    _add_admin(admin_client, tradeshow_id)
+
+    assert _flashes(admin_client) == ['Could not add attendee. Please check the details and try again.']
+    assert TradeShowAssignment.query.count() == 0
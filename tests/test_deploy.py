@@ -0,0 +1,14 @@
+from models import db
+import deploy
+
+
+def test_upgrade_database_adds_missing_columns(app):
+    db.session.execute(db.text('ALTER TABLE receipt DROP COLUMN status'))
+    db.session.commit()
+
+    assert deploy.upgrade_database()
+
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('receipt')}
+    assert 'status' in columns
+    # A second run finds nothing to change
+    assert deploy.upgrade_database()
@@ -0,0 +1,29 @@
+import pytest
+
+from models import db, User
+from utils import keyset_paginate
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_keyset_paginate_walks_rows_created_in_the_same_second(app, bulk):
+    rows = [
+        dict(username=f'user{i}', email=f'user{i}@example.com', password_hash='x',
+             full_name=f'User {i}', role='attendee')
+        for i in range(45)
+    ]
+    if bulk:
+        db.session.execute(db.insert(User), rows)
+    else:
+        db.session.add_all([User(**row) for row in rows])
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    for _ in range(10):
+        users, cursor = keyset_paginate(User.query, User.created_at, User.id, after=cursor, per_page=20)
+        seen.extend(user.id for user in users)
+        if cursor is None:
+            break
+
+    assert cursor is None
+    assert len(seen) == len(set(seen)) == User.query.count()
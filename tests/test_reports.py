@@ -0,0 +1,77 @@
+import pickle
+from datetime import date
+
+from models import db, Company, Expense, ExpenseCategory, TradeShow, User
+import utils
+
+
+def _add_expense(title='Booth rental', tradeshow=None):
+    admin = User.query.filter_by(username='admin').one()
+    if tradeshow is None:
+        tradeshow = TradeShow(name='Expo', start_date=date(2024, 1, 1), end_date=date(2024, 1, 3),
+                              location='Las Vegas', created_by=admin.id)
+        db.session.add(tradeshow)
+        db.session.flush()
+    expense = Expense(tradeshow_id=tradeshow.id, user_id=admin.id, title=title, amount=125,
+                      expense_date=date(2024, 1, 2), category_id=ExpenseCategory.query.first().id,
+                      approved_by=admin.id, status='approved')
+    db.session.add(expense)
+    db.session.commit()
+    return expense
+
+
+def test_cached_report_holds_plain_rows(app, shared_cache):
+    _add_expense()
+
+    report = utils.generate_expense_report('html')
+    cached = shared_cache.get(utils._report_cache_key(None, None, None, None))
+
+    assert cached is not None
+    row = cached['expenses'][0]
+    assert isinstance(row, dict)
+    assert row['title'] == 'Booth rental'
+    assert row['user_name'] == row['approver_name'] == 'System Administrator'
+    assert b'password_hash' not in pickle.dumps(cached)
+    assert report['expense_count'] == 1
+
+
+def test_report_version_bumps_on_commit_not_flush(app, shared_cache):
+    expense = _add_expense()
+    version = shared_cache.get(utils.REPORT_VERSION_KEY)
+
+    expense.title = 'Updated'
+    db.session.flush()
+    assert shared_cache.get(utils.REPORT_VERSION_KEY) == version
+
+    db.session.rollback()
+    assert shared_cache.get(utils.REPORT_VERSION_KEY) == version
+
+    expense.title = 'Updated'
+    db.session.commit()
+    assert shared_cache.get(utils.REPORT_VERSION_KEY) != version
+
+
+def _report_queries(**filters):
+    with utils.count_queries(db.session) as statements:
+        utils.generate_expense_report('html', **filters)
+    return len(statements)
+
+
+def test_report_query_budget_does_not_grow_with_rows(app, caplog, monkeypatch):
+    tradeshow = _add_expense().tradeshow
+    filters = {'tradeshow_id': tradeshow.id, 'company_id': Company.query.first().id}
+    db.session.expire_all()
+    few = _report_queries(**filters)
+
+    for i in range(10):
+        _add_expense(f'Expense {i}', tradeshow)
+    db.session.expire_all()
+
+    # Totals, rows and the two filter-label lookups (uncached under NullCache)
+    assert _report_queries(**filters) == few <= 4
+
+    # Debug logging counts the whole build, not just the row query
+    monkeypatch.setattr(app, 'debug', True)
+    with caplog.at_level('INFO'):
+        utils.generate_expense_report('html', **filters)
+    assert f'report queries={few}' in caplog.text
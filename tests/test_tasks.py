@@ -0,0 +1,193 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from sqlalchemy import update
+
+from models import db, Company, Expense, ExpenseCategory, TradeShow, User
+import accounting
+import tasks
+import utils
+
+
+@pytest.fixture
+def approved_expenses(app):
+    admin = User.query.filter_by(username='admin').one()
+    tradeshow = TradeShow(name='Expo', start_date=date(2024, 1, 1), end_date=date(2024, 1, 3),
+                          location='Las Vegas', created_by=admin.id)
+    db.session.add(tradeshow)
+    db.session.flush()
+    expenses = [
+        Expense(tradeshow_id=tradeshow.id, user_id=admin.id, title=f'Expense {i}', amount=10,
+                expense_date=date(2024, 1, 2), category_id=ExpenseCategory.query.first().id,
+                company_id=Company.query.first().id, status='approved')
+        for i in range(3)
+    ]
+    db.session.add_all(expenses)
+    db.session.commit()
+    return [expense.id for expense in expenses]
+
+
+@pytest.fixture
+def zoho_calls(monkeypatch):
+    calls = []
+
+    def fake_push(expense):
+        calls.append(expense.id)
+        return {'success': True, 'expense_id': f'zoho-{expense.id}'}
+
+    monkeypatch.setattr(tasks, 'push_expense_to_zoho', fake_push)
+    return calls
+
+
+def test_queued_pushes_share_a_view_refresh(approved_expenses, zoho_calls, monkeypatch):
+    refreshes = []
+    queued_refreshes = []
+    monkeypatch.setattr(accounting, 'refresh_monthly_expense_view', lambda: refreshes.append(1))
+    monkeypatch.setattr(tasks, 'use_monthly_expense_view', lambda: True)
+    monkeypatch.setattr(tasks, 'enqueue_monthly_view_refresh', lambda: queued_refreshes.append(1))
+
+    for expense_id in approved_expenses:
+        assert tasks.push_expense(expense_id)['success']
+
+    assert refreshes == []
+    assert len(queued_refreshes) == len(approved_expenses)
+
+
+
+def test_view_refresh_drops_stats_cached_before_it(approved_expenses, zoho_calls, shared_cache, monkeypatch):
+    view = {'total': 0}
+
+    def stats_from_view(current_year):
+        return [], [], [db.session.query(db.literal('Stub').label('name'), db.literal(view['total']).label('total')).one()]
+
+    def refresh_view():
+        view['total'] = db.session.query(db.func.sum(Expense.amount)).filter_by(status='processed').scalar()
+
+    monkeypatch.setattr(accounting, 'use_monthly_expense_view', lambda: True)
+    monkeypatch.setattr(accounting, '_expense_stats_from_view', stats_from_view)
+    monkeypatch.setattr(tasks, 'use_monthly_expense_view', lambda: True)
+    monkeypatch.setattr(tasks, 'refresh_monthly_expense_view', refresh_view)
+    monkeypatch.setattr(tasks, 'enqueue_monthly_view_refresh', lambda: None)
+
+    assert tasks.push_expense(approved_expenses[0])['success']
+    # The dashboard is loaded before the queued refresh runs
+    before = accounting._expense_stats_payload()
+
+    tasks.refresh_monthly_view()
+
+    assert accounting._expense_stats_payload() != before
+    assert accounting._expense_stats_payload()['companies'] == [{'name': 'Stub', 'total': 10.0}]
+
+class FakeQueue:
+    connection = None
+
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue(self, func, *args, job_id=None, **kwargs):
+        self.enqueued.append(job_id)
+        return job_id
+
+
+class FakeJob:
+    def __init__(self, status):
+        self.status = status
+
+    def get_status(self):
+        return self.status
+
+
+@pytest.mark.parametrize('status, enqueued', [
+    ('queued', []),
+    ('started', ['job-1']),
+    ('finished', ['job-1']),
+    (None, ['job-1'])
+])
+def test_enqueue_unique_skips_waiting_jobs(monkeypatch, status, enqueued):
+    def fetch(job_id, connection=None):
+        if status is None:
+            raise NoSuchJobError(job_id)
+        return FakeJob(status)
+
+    monkeypatch.setattr(Job, 'fetch', staticmethod(fetch))
+    queue = FakeQueue()
+
+    utils._enqueue_unique(queue, 'job-1', 'tasks.refresh_monthly_view')
+
+    assert queue.enqueued == enqueued
+
+
+def test_duplicate_push_jobs_call_zoho_once(approved_expenses, zoho_calls, monkeypatch):
+    monkeypatch.setattr(tasks, 'use_monthly_expense_view', lambda: False)
+    expense_id = approved_expenses[0]
+
+    assert tasks.push_expense(expense_id)['success']
+    assert not tasks.push_expense(expense_id)['success']
+
+    assert zoho_calls == [expense_id]
+
+
+def test_concurrent_push_job_does_not_push_twice(approved_expenses, monkeypatch):
+    monkeypatch.setattr(tasks, 'use_monthly_expense_view', lambda: False)
+    expense_id = approved_expenses[0]
+    calls = []
+    second_job = []
+
+    def fake_push(expense):
+        calls.append(expense.id)
+        if len(calls) == 1:
+            # A duplicate job starts on another worker while Zoho is still responding
+            second_job.append(tasks.push_expense(expense_id))
+        return {'success': True, 'expense_id': 'zoho-1'}
+
+    monkeypatch.setattr(tasks, 'push_expense_to_zoho', fake_push)
+
+    assert tasks.push_expense(expense_id)['success']
+    assert not second_job[0]['success']
+    assert calls == [expense_id]
+
+
+def test_failed_push_releases_the_claim(approved_expenses, monkeypatch):
+    monkeypatch.setattr(tasks, 'push_expense_to_zoho', lambda expense: {'success': False, 'error': 'down'})
+    expense_id = approved_expenses[0]
+
+    assert not tasks.push_expense(expense_id)['success']
+
+    db.session.expire_all()
+    assert db.session.get(Expense, expense_id).status == 'approved'
+
+
+def test_enqueue_zoho_push_uses_a_per_expense_job_id(app, monkeypatch):
+    queue = FakeQueue()
+    jobs = {}
+    monkeypatch.setattr(utils, '_task_queue', lambda name: queue)
+
+    def fetch(job_id, connection=None):
+        if job_id not in jobs:
+            raise NoSuchJobError(job_id)
+        return jobs[job_id]
+
+    monkeypatch.setattr(Job, 'fetch', staticmethod(fetch))
+
+    utils.enqueue_zoho_push(7)
+    jobs['zoho-push-7'] = FakeJob('started')
+    utils.enqueue_zoho_push(7)
+
+    assert queue.enqueued == ['zoho-push-7']
+
+
+def test_stale_push_claims_go_back_to_approved(approved_expenses):
+    stale_id, fresh_id, _ = approved_expenses
+    db.session.execute(update(Expense).where(Expense.id.in_([stale_id, fresh_id])).values(status='pushing'))
+    db.session.execute(update(Expense).where(Expense.id == stale_id).values(
+        updated_at=datetime.utcnow() - accounting.PUSH_CLAIM_TIMEOUT - timedelta(minutes=1)))
+    db.session.commit()
+
+    assert accounting._expense_status_counts()[2] == 2
+    assert accounting.release_stale_push_claims() == 1
+
+    db.session.expire_all()
+    assert db.session.get(Expense, stale_id).status == 'approved'
+    assert db.session.get(Expense, fresh_id).status == 'pushing'
@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import version
+
+COMMIT = 'a1b2c3d4e5f60718293a4b5c6d7e8f9012345678'
+
+
+@pytest.fixture
+def git_dir(tmp_path, monkeypatch):
+    """A throwaway checkout whose .git the version manager reads"""
+    monkeypatch.setattr(version, 'MODULE_DIR', str(tmp_path))
+    git_dir = tmp_path / '.git'
+    (git_dir / 'refs' / 'heads').mkdir(parents=True)
+    return git_dir
+
+
+@pytest.fixture
+def manager():
+    return version.VersionManager()
+
+
+@pytest.fixture
+def version_file(tmp_path, manager):
+    """Point the manager at a version.json under tmp_path"""
+    manager.version_file = tmp_path / 'version.json'
+    return manager.version_file
+
+
+def _write_version(path, mtime, **fields):
+    path.write_text(json.dumps(dict(version.DEFAULT_VERSION, **fields)))
+    # Explicit mtimes, since two writes can land within the filesystem's resolution
+    os.utime(path, (mtime, mtime))
+
+
+def test_reads_branch_from_loose_ref(git_dir, manager):
+    (git_dir / 'HEAD').write_text('ref: refs/heads/main\n')
+    (git_dir / 'refs' / 'heads' / 'main').write_text(COMMIT + '\n')
+
+    assert manager._read_git_info() == ('a1b2c3d', 'main')
+
+
+def test_detached_head_has_no_branch(git_dir, manager):
+    (git_dir / 'HEAD').write_text(COMMIT + '\n')
+
+    assert manager._read_git_info() == ('a1b2c3d', None)
+
+
+def test_reads_ref_only_in_packed_refs(git_dir, manager):
+    (git_dir / 'HEAD').write_text('ref: refs/heads/release/1.0\n')
+    (git_dir / 'packed-refs').write_text(
+        '# pack-refs with: peeled fully-peeled sorted \n'
+        f'{"0" * 40} refs/heads/main\n'
+        f'{COMMIT} refs/heads/release/1.0\n'
+        f'{"1" * 40} refs/tags/v1.0.0\n'
+        f'^{"2" * 40}\n'
+    )
+
+    assert manager._read_git_info() == ('a1b2c3d', 'release/1.0')
+
+
+def _worktree(tmp_path, monkeypatch):
+    # In a worktree .git is a file pointing elsewhere, so reading it directly fails
+    monkeypatch.setattr(version, 'MODULE_DIR', str(tmp_path))
+    (tmp_path / '.git').write_text('gitdir: /elsewhere/.git/worktrees/main\n')
+
+
+def test_falls_back_to_pygit2(tmp_path, monkeypatch, manager):
+    _worktree(tmp_path, monkeypatch)
+    head = SimpleNamespace(target=COMMIT, shorthand='main')
+    repo = SimpleNamespace(head=head, head_is_detached=False)
+    fake_pygit2 = SimpleNamespace(Repository=lambda path: repo, GitError=Exception)
+    monkeypatch.setitem(sys.modules, 'pygit2', fake_pygit2)
+
+    assert manager._read_git_info() == ('a1b2c3d', 'main')
+
+
+@pytest.mark.parametrize('branch, expected', [('main', 'main'), ('HEAD', None)])
+def test_falls_back_to_git_without_pygit2(tmp_path, monkeypatch, manager, branch, expected):
+    _worktree(tmp_path, monkeypatch)
+    # A None entry makes "import pygit2" raise ImportError
+    monkeypatch.setitem(sys.modules, 'pygit2', None)
+    monkeypatch.setattr(version.VersionManager, '_git_available', True)
+    calls = []
+
+    def check_output(args, **kwargs):
+        calls.append(args)
+        return f'{COMMIT}\n{branch}\n'.encode()
+
+    monkeypatch.setattr(version.subprocess, 'check_output', check_output)
+
+    assert manager._read_git_info() == ('a1b2c3d', expected)
+    assert calls[0][1:] == ['rev-parse', 'HEAD', '--abbrev-ref', 'HEAD']
+
+
+def test_edited_version_file_is_picked_up_by_mtime(version_file, manager):
+    _write_version(version_file, 1_000_000, build=1)
+    assert manager.get_version_string() == '1.0.0.1'
+    assert manager.get_version_info_fast()['build'] == 1
+
+    _write_version(version_file, 1_000_060, minor=2, build=7)
+
+    assert manager.get_version_string() == '1.2.0.7'
+    assert manager.get_version_bytes() == b'1.2.0.7'
+    assert manager.get_version_info_fast()['version'] == '1.2.0.7'
+
+
+def test_unchanged_version_file_is_not_reread(version_file, manager, monkeypatch):
+    _write_version(version_file, 1_000_000, build=1)
+    manager.get_version_string()
+
+    monkeypatch.setattr(manager, '_load_version', lambda: pytest.fail('version.json was re-read'))
+
+    assert manager.get_version_string() == '1.0.0.1'
+
+
+def test_saved_version_round_trips(version_file, manager, monkeypatch):
+    _write_version(version_file, 1_000_000, build=1)
+    manager._git_cache = ('a1b2c3d', 'main')
+    replaced = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        replaced.append((src, dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(version.os, 'replace', replace)
+
+    assert manager.increment_version('minor') == '1.1.0.2'
+
+    # Written beside version.json and renamed over it in one step
+    assert replaced == [(version_file.with_suffix('.json.tmp'), version_file)]
+    assert not version_file.with_suffix('.json.tmp').exists()
+    saved = json.loads(version_file.read_text())
+    assert (saved['minor'], saved['build'], saved['git_commit'], saved['git_branch']) == (1, 2, 'a1b2c3d', 'main')
+
+    reader = version.VersionManager()
+    reader.version_file = version_file
+    assert reader.get_version_string() == '1.1.0.2'
@@ -0,0 +1,45 @@
+from models import db, Company
+import utils
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeZohoHttp:
+    def __init__(self):
+        self.refreshes = []
+
+    def post(self, url, data=None, **kwargs):
+        self.refreshes.append(data['refresh_token'])
+        return FakeResponse({'access_token': f"token-for-{data['refresh_token']}", 'expires_in': 3600})
+
+
+def test_reconfiguring_zoho_drops_the_cached_token(app, admin_client, shared_cache, monkeypatch):
+    http = FakeZohoHttp()
+    monkeypatch.setattr(utils, '_zoho_http', lambda: http)
+
+    company = Company.query.first()
+    company.zoho_refresh_token = 'old-refresh'
+    db.session.commit()
+
+    assert utils.get_zoho_access_token(company) == 'token-for-old-refresh'
+    assert utils.get_zoho_access_token(company) == 'token-for-old-refresh'
+    assert http.refreshes == ['old-refresh']
+
+    response = admin_client.post(f'/accounting/companies/{company.id}/configure-zoho', data={
+        'zoho_org_id': 'org-2',
+        'zoho_access_token': '',
+        'zoho_refresh_token': 'new-refresh'
+    })
+    assert response.status_code == 302
+
+    company = db.session.get(Company, company.id)
+    assert utils.get_zoho_access_token(company) == 'token-for-new-refresh'
+    assert http.refreshes == ['old-refresh', 'new-refresh']
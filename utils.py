@@ -1,52 +1,204 @@
-from functools import wraps
+from functools import wraps, lru_cache
+from collections import namedtuple
 from flask import redirect, url_for, flash, current_app
 from flask_login import current_user
+from flask_caching import Cache
+from werkzeug.security import generate_password_hash
+import io
 import os
 import re
-import requests
 import json
 from datetime import datetime, date
 from decimal import Decimal
 import uuid
-import pandas as pd
-from io import BytesIO
 import base64
+import tempfile
+import time
+import threading
+import contextlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import tuple_, event
+from sqlalchemy.orm import aliased, object_session
+from config import Config, OCR_SETTINGS
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+cache = Cache()
 
 # File upload settings
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+ALLOWED_EXTENSIONS = Config.ALLOWED_EXTENSIONS
+
+# Password hashing; scrypt runs in C via hashlib and is quicker than 600k pbkdf2 rounds
+PASSWORD_HASH_METHOD = 'scrypt'
+PASSWORD_SALT_LENGTH = 16
+
+def hash_password(password):
+    """Hash a password for storage in User.password_hash"""
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH)
+
+# Concurrent Zoho API requests for bulk pushes (also the keep-alive pool size)
+ZOHO_PUSH_WORKERS = 16
+
+# Zoho access tokens last an hour; reuse them until a minute before expiry
+ZOHO_TOKEN_CACHE_KEY = 'zoho_token:{}'
+ZOHO_TOKEN_LIFETIME = 3600
+ZOHO_TOKEN_EXPIRY_MARGIN = 60
+
+# Shared pool for WorkDrive uploads so uploads from concurrent requests overlap
+ZOHO_UPLOAD_WORKERS = 8
+ZOHO_UPLOAD_TIMEOUT = 60
+_workdrive_pool = ThreadPoolExecutor(max_workers=ZOHO_UPLOAD_WORKERS, thread_name_prefix='workdrive')
+
+# Background jobs (run with: rq worker zoho receipts)
+ZOHO_QUEUE_NAME = 'zoho'
+ZOHO_JOB_TIMEOUT = 60
+ZOHO_PUSH_JOB_ID = 'zoho-push-{}'
+RECEIPT_QUEUE_NAME = 'receipts'
+RECEIPT_JOB_TIMEOUT = 300
+VIEW_REFRESH_JOB_ID = 'refresh-monthly-expense-view'
+
+def parse_iso_date(value):
+    """Parse a YYYY-MM-DD form value, returning None if it is missing or invalid"""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def split_ext(filename):
+    """Return (allowed, extension) for an uploaded filename, splitting it once"""
+    _, dot, ext = (filename or '').rpartition('.')
+    ext = ext.lower()
+    if not dot or ext not in ALLOWED_EXTENSIONS:
+        return False, None
+    return True, ext
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return split_ext(filename)[0]
+
+# Lookup lists for filter and form dropdowns
+# Kept per process as plain (id, name) tuples; a version stamp in the shared
+# cache tells every worker when companies, trade shows or categories have changed.
+LookupItem = namedtuple('LookupItem', ['id', 'name'])
+LOOKUP_VERSION_KEY = 'lookup_version'
+
+def _lookup_version():
+    """Current lookup version, or None when no shared cache is configured"""
+    version = cache.get(LOOKUP_VERSION_KEY)
+    if version is None:
+        cache.add(LOOKUP_VERSION_KEY, time.time(), timeout=0)
+        version = cache.get(LOOKUP_VERSION_KEY)
+    return version
+
+def bump_lookup_version():
+    """Invalidate cached lookup lists in every worker"""
+    cache.set(LOOKUP_VERSION_KEY, time.time(), timeout=0)
+
+def _load_active_companies():
+    from models import Company
+    rows = Company.query.with_entities(Company.id, Company.name).filter_by(is_active=True).all()
+    return tuple(LookupItem(row.id, row.name) for row in rows)
+
+def _load_active_categories():
+    from models import ExpenseCategory
+    rows = ExpenseCategory.query.with_entities(ExpenseCategory.id, ExpenseCategory.name).filter_by(is_active=True).all()
+    return tuple(LookupItem(row.id, row.name) for row in rows)
+
+def _load_tradeshows():
+    from models import TradeShow
+    rows = TradeShow.query.with_entities(TradeShow.id, TradeShow.name).all()
+    return tuple(LookupItem(row.id, row.name) for row in rows)
+
+@lru_cache(maxsize=1)
+def _active_companies_cached(version):
+    return _load_active_companies()
+
+@lru_cache(maxsize=1)
+def _active_categories_cached(version):
+    return _load_active_categories()
+
+@lru_cache(maxsize=1)
+def _tradeshows_cached(version):
+    return _load_tradeshows()
+
+def get_active_companies():
+    """Active companies as (id, name) tuples"""
+    version = _lookup_version()
+    if version is None:
+        return _load_active_companies()
+    return _active_companies_cached(version)
+
+def get_active_categories():
+    """Active expense categories as (id, name) tuples"""
+    version = _lookup_version()
+    if version is None:
+        return _load_active_categories()
+    return _active_categories_cached(version)
+
+def get_tradeshows():
+    """All trade shows as (id, name) tuples"""
+    version = _lookup_version()
+    if version is None:
+        return _load_tradeshows()
+    return _tradeshows_cached(version)
+
+# Pagination helpers
+def _encode_cursor(created_at, row_id):
+    """Encode a (timestamp, id) seek position as an opaque URL-safe token"""
+    payload = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode a cursor token, returning None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def keyset_paginate(query, cursor_col, tiebreaker, after=None, per_page=20):
+    """
+    Seek pagination ordered by (cursor_col, tiebreaker) descending.
+    Avoids the COUNT(*) and LIMIT/OFFSET scan issued by paginate(); fetches
+    one extra row to decide whether a next page exists.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    position = _decode_cursor(after)
+    if position:
+        query = query.filter(tuple_(cursor_col, tiebreaker) < position)
+    
+    rows = query.order_by(cursor_col.desc(), tiebreaker.desc()).limit(per_page + 1).all()
+    
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = _encode_cursor(getattr(last, cursor_col.key), getattr(last, tiebreaker.key))
+    
+    return rows, next_cursor
 
 # Role-based access decorators
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role != 'admin':
-            flash('Access denied. Admin privileges required.', 'error')
-            return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+ADMIN_ROLES = frozenset({'admin'})
+COORDINATOR_ROLES = frozenset({'admin', 'coordinator'})
+ACCOUNTING_ROLES = frozenset({'admin', 'accounting'})
 
-def coordinator_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role not in ['admin', 'coordinator']:
-            flash('Access denied. Coordinator privileges required.', 'error')
-            return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+def role_required(roles, message):
+    """Build a decorator that only lets users whose role is in roles through"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not (current_user.is_authenticated and current_user.role in roles):
+                flash(message, 'error')
+                return redirect(url_for('auth.login'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
-def accounting_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role not in ['admin', 'accounting']:
-            flash('Access denied. Accounting privileges required.', 'error')
-            return redirect(url_for('auth.login'))
-        return f(*args, **kwargs)
-    return decorated_function
+admin_required = role_required(ADMIN_ROLES, 'Access denied. Admin privileges required.')
+coordinator_required = role_required(COORDINATOR_ROLES, 'Access denied. Coordinator privileges required.')
+accounting_required = role_required(ACCOUNTING_ROLES, 'Access denied. Accounting privileges required.')
 
 def attendee_required(f):
     @wraps(f)
@@ -58,72 +210,293 @@ def attendee_required(f):
     return decorated_function
 
 # OCR Processing Functions
-def process_receipt_ocr(file_path):
+_tesseract_local = threading.local()
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEPS = 101
+DESKEW_SAMPLE_WIDTH = 600
+
+def _empty_ocr_results():
+    return {
+        'text': '',
+        'confidence': 0,
+        'amount': None,
+        'date': None,
+        'merchant': None
+    }
+
+def _ocr_available():
+    try:
+        import cv2  # noqa: F401
+        import tesserocr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _estimate_skew(binary):
+    """Projection-profile skew estimate: the angle whose row sums vary most"""
+    import cv2
+    import numpy as np
+    
+    # Score angles on a downscaled copy, text pixels set
+    scale = min(1.0, DESKEW_SAMPLE_WIDTH / binary.shape[1])
+    sample = cv2.resize(binary, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    sample = cv2.bitwise_not(sample)
+    h, w = sample.shape
+    center = (w / 2, h / 2)
+    
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.linspace(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE, DESKEW_STEPS):
+        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rotated = cv2.warpAffine(sample, matrix, (w, h), flags=cv2.INTER_NEAREST)
+        profile = rotated.sum(axis=1, dtype=np.float64)
+        score = float(np.square(np.diff(profile)).sum())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    
+    return best_angle
+
+def _decode_flags(source, max_width):
     """
-    Process receipt using OCR to extract information
-    This is a placeholder implementation. In production, you would use:
-    - Google Cloud Vision API
-    - AWS Textract
-    - Azure Computer Vision
-    - Tesseract OCR
+    Grayscale decode flags, asking the decoder for a 1/2, 1/4 or 1/8 scale
+    image when the receipt is still at least max_width wide at that scale
+    (JPEG decodes straight to the smaller size)
     """
+    import cv2
+    from PIL import Image
+    
+    if not max_width:
+        return cv2.IMREAD_GRAYSCALE
+    
     try:
-        # Placeholder OCR processing
-        # In a real implementation, you would:
-        # 1. Use an OCR service to extract text
-        # 2. Use regex patterns to find amounts, dates, merchants
-        # 3. Apply machine learning models for better accuracy
+        # Reads the header only
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as header:
+            width = header.size[0]
+    except Exception:
+        return cv2.IMREAD_GRAYSCALE
+    
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+                         (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                         (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if width // factor >= max_width:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+def preprocess_receipt_image(source):
+    """
+    Grayscale, resize, denoise, Otsu-binarize and deskew a receipt image
+    so Tesseract can skip its own preprocessing
+    Accepts a file path or the uploaded bytes
+    Returns a uint8 array, or None if the data is not a readable image
+    """
+    import cv2
+    import numpy as np
+    
+    settings = OCR_SETTINGS['preprocessing']
+    max_width = settings.get('resize_max_width')
+    flags = _decode_flags(source, max_width)
+    if isinstance(source, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(source, np.uint8), flags)
+    else:
+        image = cv2.imread(source, flags)
+    if image is None:
+        return None
+    
+    # Clamp the width before any other stage touches the pixels
+    if max_width and image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    if settings.get('denoise'):
+        image = cv2.fastNlMeansDenoising(image, h=10)
+    
+    if settings.get('enhance_contrast'):
+        image = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(image)
+    
+    _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    
+    angle = _estimate_skew(binary)
+    if angle:
+        h, w = binary.shape
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        binary = cv2.warpAffine(binary, matrix, (w, h), flags=cv2.INTER_NEAREST,
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+    
+    return binary
+
+def _tesseract_api():
+    """
+    Per-thread in-process Tesseract handle; the model loads once per thread
+    and tesserocr releases the GIL while recognizing
+    """
+    api = getattr(_tesseract_local, 'api', None)
+    if api is None:
+        from tesserocr import PyTessBaseAPI, PSM, OEM
         
-        # Simulate OCR results
-        ocr_results = {
-            'text': 'Sample receipt text extracted from OCR',
-            'confidence': 0.85,
-            'amount': None,
-            'date': None,
-            'merchant': None
-        }
+        api = PyTessBaseAPI(lang='eng', psm=PSM.SINGLE_BLOCK, oem=OEM.LSTM_ONLY)
+        # The image is already binarized
+        api.SetVariable('tessedit_do_invert', '0')
+        _tesseract_local.api = api
+    return api
+
+def _run_tesseract(image):
+    """OCR a preprocessed image, returning (text, mean confidence 0-1)"""
+    from PIL import Image
+    
+    api = _tesseract_api()
+    api.SetImage(Image.fromarray(image))
+    text = api.GetUTF8Text().strip()
+    confidence = api.MeanTextConf() / 100
+    api.Clear()
+    return text, confidence
+
+# Simple regex pattern for demonstration, compiled once; dates are tried
+# first so their digits aren't read as an amount
+# In production, use more sophisticated methods
+RECEIPT_FIELDS_RE = re.compile(r'(?P<date>\d{4}-\d{2}-\d{2})|\$?(?P<amount>\d+\.\d{2})')
+
+def _parse_receipt_text(text, ocr_results):
+    """Pull amount, date and merchant out of OCR text"""
+    # Extract the first amount and date in a single pass
+    for match in RECEIPT_FIELDS_RE.finditer(text):
+        if match.lastgroup == 'date':
+            if ocr_results['date'] is None:
+                ocr_results['date'] = parse_iso_date(match.group('date'))
+        elif ocr_results['amount'] is None:
+            ocr_results['amount'] = Decimal(match.group('amount'))
         
-        # Simple regex patterns for demonstration
-        # In production, use more sophisticated methods
-        sample_text = "Restaurant ABC\nDate: 2024-01-15\nTotal: $45.50\nThank you!"
+        if ocr_results['date'] is not None and ocr_results['amount'] is not None:
+            break
+    
+    # Extract merchant (first line typically)
+    ocr_results['merchant'] = text.partition('\n')[0].strip()
+    
+    return ocr_results
+
+def process_receipt_ocr(source):
+    """
+    Process receipt using OCR to extract information
+    source is a file path or the uploaded bytes
+    Uses OpenCV preprocessing + Tesseract when installed (opencv-python,
+    tesserocr); otherwise falls back to placeholder results
+    """
+    try:
+        if not _ocr_available():
+            # Simulate OCR results
+            ocr_results = _empty_ocr_results()
+            ocr_results['text'] = 'Sample receipt text extracted from OCR'
+            ocr_results['confidence'] = 0.85
+            sample_text = "Restaurant ABC\nDate: 2024-01-15\nTotal: $45.50\nThank you!"
+            return _parse_receipt_text(sample_text, ocr_results)
         
-        # Extract amount
-        amount_pattern = r'\$?(\d+\.?\d*)'
-        amount_match = re.search(amount_pattern, sample_text)
-        if amount_match:
-            ocr_results['amount'] = Decimal(amount_match.group(1))
+        image = preprocess_receipt_image(source)
+        if image is None:
+            # PDFs and other non-image uploads
+            return _empty_ocr_results()
         
-        # Extract date
-        date_pattern = r'(\d{4}-\d{2}-\d{2})'
-        date_match = re.search(date_pattern, sample_text)
-        if date_match:
-            ocr_results['date'] = datetime.strptime(date_match.group(1), '%Y-%m-%d').date()
+        text, confidence = _run_tesseract(image)
+        ocr_results = _empty_ocr_results()
+        ocr_results['text'] = text
+        ocr_results['confidence'] = confidence
         
-        # Extract merchant (first line typically)
-        lines = sample_text.split('\n')
-        if lines:
-            ocr_results['merchant'] = lines[0].strip()
+        # Too unreliable to prefill amount/date/merchant from
+        if confidence < OCR_SETTINGS['confidence_threshold']:
+            return ocr_results
         
-        return ocr_results
+        return _parse_receipt_text(text, ocr_results)
         
     except Exception as e:
         current_app.logger.error(f"OCR processing error: {str(e)}")
+        return _empty_ocr_results()
+
+def process_receipt(receipt, data=None):
+    """
+    Run OCR on a stored receipt and upload it to Zoho WorkDrive,
+    filling in the receipt's extracted and Zoho fields
+    Pass the upload's bytes as data to OCR from memory instead of the saved file
+    """
+    # Upload in the background while OCR runs on this thread
+    upload = submit_workdrive_upload(receipt.file_path, receipt.original_filename)
+    ocr_results = process_receipt_ocr(data if data is not None else receipt.file_path)
+    zoho_file_info = workdrive_upload_result(upload)
+    
+    receipt.ocr_text = ocr_results.get('text', '')
+    receipt.ocr_confidence = ocr_results.get('confidence', 0)
+    receipt.extracted_amount = ocr_results.get('amount')
+    receipt.extracted_date = ocr_results.get('date')
+    receipt.extracted_merchant = ocr_results.get('merchant')
+    receipt.zoho_file_id = zoho_file_info.get('file_id')
+    receipt.zoho_file_url = zoho_file_info.get('download_url')
+    receipt.status = 'processed'
+    return receipt
+
+# Zoho Integration Functions
+_zoho_session = None
+_zoho_session_lock = threading.Lock()
+
+def _zoho_http():
+    """
+    Shared keep-alive session for Zoho API calls, created on first use
+    Connections are pooled across requests and push threads, so each call
+    skips the TCP + TLS handshake. Rate limiting (429) and 503 responses are
+    retried with backoff; other 5xx are not, since Zoho may have created
+    the expense already.
+    """
+    global _zoho_session
+    if _zoho_session is None:
+        with _zoho_session_lock:
+            if _zoho_session is None:
+                import requests  # deferred: only needed once Zoho is actually called
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                
+                retry = Retry(
+                    total=3,
+                    read=0,  # never resend a request Zoho may have received
+                    backoff_factor=0.3,
+                    status_forcelist=[429, 503],
+                    allowed_methods=None,  # POSTs too; only for the statuses above
+                    raise_on_status=False
+                )
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=ZOHO_PUSH_WORKERS, max_retries=retry))
+                _zoho_session = session
+    return _zoho_session
+
+def submit_workdrive_upload(file_path, original_filename):
+    """Start a WorkDrive upload on the shared pool, returning its future"""
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            return upload_to_zoho_workdrive(file_path, original_filename)
+    
+    return _workdrive_pool.submit(run)
+
+def workdrive_upload_result(future, timeout=ZOHO_UPLOAD_TIMEOUT):
+    """Wait for a submitted WorkDrive upload"""
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        current_app.logger.error(f"Zoho WorkDrive upload error: {str(e)}")
         return {
-            'text': '',
-            'confidence': 0,
-            'amount': None,
-            'date': None,
-            'merchant': None
+            'success': False,
+            'error': str(e)
         }
 
-# Zoho Integration Functions
-def get_zoho_access_token(company):
+def get_zoho_access_token(company, commit=True):
     """
     Refresh Zoho access token using refresh token
+    Tokens are cached per company until shortly before Zoho expires them
+    Pass commit=False to leave saving the new token to the caller's commit
     """
     if not company.zoho_refresh_token:
         return None
     
+    cache_key = ZOHO_TOKEN_CACHE_KEY.format(company.id)
+    access_token = cache.get(cache_key)
+    if access_token:
+        return access_token
+    
     try:
         refresh_url = "https://accounts.zoho.com/oauth/v2/token"
         
@@ -134,14 +507,17 @@ def get_zoho_access_token(company):
             'grant_type': 'refresh_token'
         }
         
-        response = requests.post(refresh_url, data=data)
+        response = _zoho_http().post(refresh_url, data=data)
         
         if response.status_code == 200:
             token_data = response.json()
             company.zoho_access_token = token_data['access_token']
+            expires_in = int(token_data.get('expires_in', ZOHO_TOKEN_LIFETIME))
+            cache.set(cache_key, token_data['access_token'], timeout=max(expires_in - ZOHO_TOKEN_EXPIRY_MARGIN, 1))
             # Save to database
-            from models import db
-            db.session.commit()
+            if commit:
+                from models import db
+                db.session.commit()
             return token_data['access_token']
         else:
             current_app.logger.error(f"Failed to refresh Zoho token: {response.text}")
@@ -179,41 +555,36 @@ def upload_to_zoho_workdrive(file_path, original_filename):
             'error': str(e)
         }
 
-def push_expense_to_zoho(expense):
+def _zoho_expense_payload(expense):
+    """Build the Zoho Books expense body for an expense"""
+    return {
+        'account_name': 'Expense Account',  # Configure based on category
+        'amount': float(expense.amount),
+        'currency_code': expense.currency,
+        'date': expense.expense_date.strftime('%Y-%m-%d'),
+        'description': expense.description,
+        'employee_id': expense.user.email,  # Use email as employee identifier
+        'expense_type': 'non_billable',
+        'merchant_name': expense.title,
+        'project_name': expense.tradeshow.name,
+        'receipt_name': expense.receipt.original_filename if expense.receipt else None
+    }
+
+def _post_expense_to_zoho(org_id, access_token, expense_data):
     """
-    Push expense to Zoho Books
+    Send a prepared expense to Zoho Books
+    Touches no ORM state, so it is safe to run outside the request thread
     """
     try:
-        if not expense.company:
-            return {'success': False, 'error': 'No company assigned'}
-        
-        access_token = get_zoho_access_token(expense.company)
-        if not access_token:
-            return {'success': False, 'error': 'Failed to get Zoho access token'}
-        
-        # Prepare expense data for Zoho Books
-        expense_data = {
-            'account_name': 'Expense Account',  # Configure based on category
-            'amount': float(expense.amount),
-            'currency_code': expense.currency,
-            'date': expense.expense_date.strftime('%Y-%m-%d'),
-            'description': expense.description,
-            'employee_id': expense.user.email,  # Use email as employee identifier
-            'expense_type': 'non_billable',
-            'merchant_name': expense.title,
-            'project_name': expense.tradeshow.name,
-            'receipt_name': expense.receipt.original_filename if expense.receipt else None
-        }
-        
         headers = {
             'Authorization': f'Zoho-oauthtoken {access_token}',
             'Content-Type': 'application/json'
         }
         
         # Zoho Books API endpoint
-        api_url = f"https://books.zoho.com/api/v3/expenses?organization_id={expense.company.zoho_org_id}"
+        api_url = f"https://books.zoho.com/api/v3/expenses?organization_id={org_id}"
         
-        response = requests.post(api_url, json=expense_data, headers=headers)
+        response = _zoho_http().post(api_url, json=expense_data, headers=headers)
         
         if response.status_code in [200, 201]:
             result = response.json()
@@ -236,103 +607,354 @@ def push_expense_to_zoho(expense):
             'error': str(e)
         }
 
+def push_expense_to_zoho(expense):
+    """
+    Push expense to Zoho Books
+    """
+    try:
+        if not expense.company:
+            return {'success': False, 'error': 'No company assigned'}
+        
+        access_token = get_zoho_access_token(expense.company)
+        if not access_token:
+            return {'success': False, 'error': 'Failed to get Zoho access token'}
+        
+        return _post_expense_to_zoho(expense.company.zoho_org_id, access_token, _zoho_expense_payload(expense))
+            
+    except Exception as e:
+        current_app.logger.error(f"Zoho Books push error: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def push_expenses_to_zoho(expenses, max_workers=ZOHO_PUSH_WORKERS):
+    """
+    Push several expenses to Zoho Books concurrently
+    Tokens and payloads are resolved on the calling thread since they use the
+    database session; only the HTTP round-trips run in the thread pool.
+    Refreshed tokens are left in the session for the caller to commit.
+    Returns a list of (expense, zoho_response) pairs in completion order.
+    """
+    app = current_app._get_current_object()
+    results = []
+    jobs = []
+    tokens = {}
+    
+    for expense in expenses:
+        try:
+            company = expense.company
+            if not company:
+                results.append((expense, {'success': False, 'error': 'No company assigned'}))
+                continue
+            
+            # One token refresh per company rather than per expense
+            if company.id not in tokens:
+                tokens[company.id] = get_zoho_access_token(company, commit=False)
+            if not tokens[company.id]:
+                results.append((expense, {'success': False, 'error': 'Failed to get Zoho access token'}))
+                continue
+            
+            jobs.append((expense, company.zoho_org_id, tokens[company.id], _zoho_expense_payload(expense)))
+        except Exception as e:
+            current_app.logger.error(f"Zoho Books push error: {str(e)}")
+            results.append((expense, {'success': False, 'error': str(e)}))
+    
+    if not jobs:
+        return results
+    
+    def run(org_id, access_token, expense_data):
+        with app.app_context():
+            return _post_expense_to_zoho(org_id, access_token, expense_data)
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = {
+            executor.submit(run, org_id, access_token, expense_data): expense
+            for expense, org_id, access_token, expense_data in jobs
+        }
+        for future in as_completed(futures):
+            results.append((futures[future], future.result()))
+    
+    return results
+
+def _task_queue(name):
+    """RQ queue on the configured Redis instance"""
+    from redis import Redis
+    from rq import Queue
+    
+    return Queue(name, connection=Redis.from_url(current_app.config['REDIS_URL']))
+
+def enqueue_zoho_push(expense_id):
+    """
+    Queue a Zoho Books push for an RQ worker (see tasks.push_expense)
+    Resubmitting an expense whose push is still queued or running reuses that job
+    """
+    return _enqueue_unique(
+        _task_queue(ZOHO_QUEUE_NAME), ZOHO_PUSH_JOB_ID.format(expense_id), 'tasks.push_expense', expense_id,
+        waiting_statuses=('queued', 'deferred', 'scheduled', 'started'), job_timeout=ZOHO_JOB_TIMEOUT
+    )
+
+def _enqueue_unique(queue, job_id, func, *args, waiting_statuses=('queued', 'deferred', 'scheduled'), **kwargs):
+    """Enqueue a job under a fixed id, unless that job is already waiting to run"""
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+    
+    try:
+        job = Job.fetch(job_id, connection=queue.connection)
+        if job.get_status() in waiting_statuses:
+            return job
+    except NoSuchJobError:
+        pass
+    return queue.enqueue(func, *args, job_id=job_id, **kwargs)
+
+def enqueue_monthly_view_refresh():
+    """
+    Queue one refresh of the monthly expense view (see tasks.refresh_monthly_view)
+    Pushes finishing while a refresh is still queued share it rather than adding more
+    """
+    return _enqueue_unique(_task_queue(ZOHO_QUEUE_NAME), VIEW_REFRESH_JOB_ID, 'tasks.refresh_monthly_view')
+
+def enqueue_receipt_processing(receipt_id):
+    """Queue OCR and WorkDrive upload for an RQ worker (see tasks.process_receipt)"""
+    return _task_queue(RECEIPT_QUEUE_NAME).enqueue('tasks.process_receipt', receipt_id, job_timeout=RECEIPT_JOB_TIMEOUT)
+
 # Reporting Functions
-def generate_expense_report(report_type='html', tradeshow_id=None, company_id=None, start_date=None, end_date=None):
+EXCEL_REPORT_COLUMNS = [
+    'Date', 'Trade Show', 'User', 'Company', 'Category', 'Title', 'Description',
+    'Amount', 'Currency', 'Status', 'Approved By', 'Approved At', 'Zoho ID', 'Pushed to Zoho'
+]
+REPORT_BATCH_SIZE = 500
+
+# HTML report payloads are cached per filter set; any expense write bumps the
+# version stamp, which retires every cached report at once
+REPORT_CACHE_TIMEOUT = 300
+REPORT_CACHE_MAX_ROWS = 1000
+REPORT_VERSION_KEY = 'report_version'
+
+def _report_cache_key(*filters):
+    version = cache.get(REPORT_VERSION_KEY)
+    return 'expense_report:' + hashlib.sha1(repr((version,) + filters).encode()).hexdigest()
+
+def bump_report_version():
+    """Invalidate cached expense reports in every worker"""
+    cache.set(REPORT_VERSION_KEY, time.time(), timeout=0)
+
+def _expense_changed(mapper, connection, target):
+    # Mapper events fire during flush, before the change is visible to other
+    # requests; remember it and bump once the session commits
+    session = object_session(target)
+    if session is not None:
+        session.info['expenses_changed'] = True
+
+def _bump_after_commit(session):
+    if session.info.pop('expenses_changed', False):
+        bump_report_version()
+
+def _forget_after_rollback(session):
+    session.info.pop('expenses_changed', None)
+
+def register_report_cache_events():
     """
-    Generate expense reports in various formats
+    Invalidate cached reports whenever a committed unit of work wrote an expense
+    Bulk statements skip mapper events, so their callers bump the version themselves
     """
-    from models import Expense, TradeShow, Company, User, ExpenseCategory
+    from models import db, Expense
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        if not event.contains(Expense, name, _expense_changed):
+            event.listen(Expense, name, _expense_changed)
+    for name, listener in (('after_commit', _bump_after_commit), ('after_rollback', _forget_after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+@contextlib.contextmanager
+def count_queries(session):
+    """
+    Collect the SQL statements executed on the session's engine while the block runs
+    Used to catch N+1 regressions in the report and Zoho flows
+    """
+    statements = []
+    engine = session.get_bind()
     
-    # Build query
-    query = Expense.query
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
     
-    if tradeshow_id:
-        query = query.filter_by(tradeshow_id=tradeshow_id)
-    if company_id:
-        query = query.filter_by(company_id=company_id)
-    if start_date:
-        query = query.filter(Expense.expense_date >= start_date)
-    if end_date:
-        query = query.filter(Expense.expense_date <= end_date)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def _filter_label(model, item_id, lookup):
+    """Name for a report filter, taken from the cached lookup list when possible"""
+    if not item_id:
+        return None
     
-    expenses = query.all()
+    item_id = int(item_id)
+    for item in lookup():
+        if item.id == item_id:
+            return item.name
+    
+    # Not in the cached list (e.g. an inactive company); the identity map
+    # usually has it from the report's eager loads
+    from models import db
+    item = db.session.get(model, item_id)
+    return item.name if item else None
+
+def _expense_report_select(approver, filters, *columns):
+    """Select columns from expenses joined to the names reports show, in id order"""
+    from models import db, Expense
     
-    # Prepare report data
-    report_data = {
+    return db.select(*columns).select_from(Expense).join(Expense.tradeshow).join(Expense.user).outerjoin(
+        Expense.company).outerjoin(Expense.category).outerjoin(approver, Expense.approver).where(
+        *filters).order_by(Expense.id)
+
+def _build_html_report(stmt, filters, tradeshow_id, company_id, start_date, end_date):
+    """Run the HTML report's queries and assemble its payload"""
+    from models import db, Expense, TradeShow, Company
+    
+    # Totals are aggregated by the database rather than summed over rows
+    total_amount, expense_count = db.session.query(
+        db.func.coalesce(db.func.sum(Expense.amount), 0),
+        db.func.count(Expense.id)
+    ).filter(*filters).one()
+    
+    expenses = [row._asdict() for row in db.session.execute(stmt)]
+    
+    return {
         'title': 'Expense Report',
         'generated_at': datetime.now(),
         'filters': {
-            'tradeshow': TradeShow.query.get(tradeshow_id).name if tradeshow_id else None,
-            'company': Company.query.get(company_id).name if company_id else None,
+            'tradeshow': _filter_label(TradeShow, tradeshow_id, get_tradeshows),
+            'company': _filter_label(Company, company_id, get_active_companies),
             'start_date': start_date,
             'end_date': end_date
         },
         'expenses': expenses,
-        'total_amount': sum(expense.amount for expense in expenses),
-        'expense_count': len(expenses)
+        'total_amount': total_amount,
+        'expense_count': expense_count
     }
+
+def generate_expense_report(report_type='html', tradeshow_id=None, company_id=None, start_date=None, end_date=None):
+    """
+    Generate expense reports in various formats
+    """
+    from models import db, Expense, TradeShow, Company, User, ExpenseCategory
+    
+    # Build filters
+    filters = []
+    if tradeshow_id:
+        filters.append(Expense.tradeshow_id == tradeshow_id)
+    if company_id:
+        filters.append(Expense.company_id == company_id)
+    if start_date:
+        filters.append(Expense.expense_date >= start_date)
+    if end_date:
+        filters.append(Expense.expense_date <= end_date)
+    
+    approver = aliased(User)
     
     if report_type == 'excel':
-        return generate_excel_report(report_data)
-    else:
+        # Select just the exported columns, already in sheet order, so no ORM
+        # objects are built; rows are streamed into the workbook as they arrive
+        stmt = _expense_report_select(
+            approver,
+            filters,
+            Expense.expense_date,
+            TradeShow.name,
+            User.full_name,
+            db.func.coalesce(Company.name, ''),
+            db.func.coalesce(ExpenseCategory.name, ''),
+            Expense.title,
+            Expense.description,
+            Expense.amount,
+            Expense.currency,
+            Expense.status,
+            db.func.coalesce(approver.full_name, ''),
+            Expense.approved_at,
+            db.func.coalesce(Expense.zoho_expense_id, ''),
+            db.case((Expense.pushed_to_zoho == True, 'Yes'), else_='No')
+        )
+        
+        rows = db.session.execute(stmt.execution_options(yield_per=REPORT_BATCH_SIZE))
+        return generate_excel_report(rows, datetime.now())
+    
+    cache_key = _report_cache_key(tradeshow_id, company_id, start_date, end_date)
+    report_data = cache.get(cache_key)
+    if report_data is not None:
         return report_data
+    
+    # Plain rows of just the fields the report shows, so the cached payload
+    # holds no ORM objects (or the user rows behind them)
+    stmt = _expense_report_select(
+        approver,
+        filters,
+        Expense.id,
+        Expense.expense_date,
+        TradeShow.name.label('tradeshow_name'),
+        User.full_name.label('user_name'),
+        Company.name.label('company_name'),
+        ExpenseCategory.name.label('category_name'),
+        Expense.title,
+        Expense.description,
+        Expense.amount,
+        Expense.currency,
+        Expense.status,
+        approver.full_name.label('approver_name'),
+        Expense.approved_at,
+        Expense.zoho_expense_id,
+        Expense.pushed_to_zoho,
+        Expense.receipt_id
+    )
+    
+    if current_app.debug:
+        # Count every statement the report needs: totals, rows and filter labels
+        with count_queries(db.session) as statements:
+            report_data = _build_html_report(stmt, filters, tradeshow_id, company_id, start_date, end_date)
+        current_app.logger.info('report queries=%d', len(statements))
+    else:
+        report_data = _build_html_report(stmt, filters, tradeshow_id, company_id, start_date, end_date)
+    
+    # Very large reports aren't worth the cache memory
+    if report_data['expense_count'] <= REPORT_CACHE_MAX_ROWS:
+        cache.set(cache_key, report_data, timeout=REPORT_CACHE_TIMEOUT)
+    return report_data
 
-def generate_excel_report(report_data):
+def generate_excel_report(rows, generated_at):
     """
-    Generate Excel report
+    Generate Excel report from rows already in EXCEL_REPORT_COLUMNS order
+    Writes rows as they are read using a write-only workbook backed by a
+    temporary file, so neither the rows nor the finished file are held in memory.
+    Returns an open file positioned at the start for streaming to the client.
     """
+    from openpyxl import Workbook  # deferred: only needed for Excel exports
+    
     try:
-        # Create DataFrame
-        expense_list = []
-        for expense in report_data['expenses']:
-            expense_list.append({
-                'Date': expense.expense_date,
-                'Trade Show': expense.tradeshow.name,
-                'User': expense.user.full_name,
-                'Company': expense.company.name if expense.company else '',
-                'Category': expense.category.name if expense.category else '',
-                'Title': expense.title,
-                'Description': expense.description,
-                'Amount': float(expense.amount),
-                'Currency': expense.currency,
-                'Status': expense.status,
-                'Approved By': expense.approver.full_name if expense.approver else '',
-                'Approved At': expense.approved_at,
-                'Zoho ID': expense.zoho_expense_id or '',
-                'Pushed to Zoho': 'Yes' if expense.pushed_to_zoho else 'No'
-            })
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Expenses')
+        sheet.append(EXCEL_REPORT_COLUMNS)
         
-        df = pd.DataFrame(expense_list)
+        expense_count = 0
+        total_amount = Decimal('0')
+        for row in rows:
+            sheet.append(tuple(row))
+            expense_count += 1
+            total_amount += row.amount
         
-        # Create Excel file in memory
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Expenses', index=False)
-            
-            # Add summary sheet
-            summary_data = {
-                'Metric': ['Total Expenses', 'Total Amount', 'Report Generated'],
-                'Value': [
-                    report_data['expense_count'],
-                    f"${report_data['total_amount']:,.2f}",
-                    report_data['generated_at'].strftime('%Y-%m-%d %H:%M:%S')
-                ]
-            }
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
+        # Add summary sheet
+        summary = workbook.create_sheet('Summary')
+        summary.append(['Metric', 'Value'])
+        summary.append(['Total Expenses', expense_count])
+        summary.append(['Total Amount', f"${total_amount:,.2f}"])
+        summary.append(['Report Generated', generated_at.strftime('%Y-%m-%d %H:%M:%S')])
         
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
         output.seek(0)
         
-        # Save to temp file
-        filename = f"expense_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        temp_path = os.path.join('temp', filename)
-        os.makedirs('temp', exist_ok=True)
-        
-        with open(temp_path, 'wb') as f:
-            f.write(output.getvalue())
+        filename = f"expense_report_{generated_at.strftime('%Y%m%d_%H%M%S')}.xlsx"
         
         return {
-            'file_path': temp_path,
+            'file': output,
             'filename': filename,
             'success': True
         }
@@ -345,38 +967,79 @@ def generate_excel_report(report_data):
         }
 
 # Data validation functions
+class ExpenseIn(BaseModel):
+    """Expense fields accepted from forms and imports; the schema is compiled once"""
+    model_config = ConfigDict(extra='ignore')
+    
+    title: str = Field(min_length=1)
+    amount: Decimal = Field(gt=0)
+    expense_date: date
+    category_id: int
+    
+    @field_validator('expense_date')
+    @classmethod
+    def not_in_future(cls, value):
+        if value > date.today():
+            raise ValueError('Expense date cannot be in the future')
+        return value
+
+# (message when missing, message when invalid) per field
+EXPENSE_FIELD_ERRORS = {
+    'title': ('Title is required', 'Title is required'),
+    'amount': ('Amount is required', 'Invalid amount format'),
+    'expense_date': ('Expense date is required', 'Invalid date format'),
+    'category_id': ('Category is required', 'Invalid category')
+}
+
+def _expense_error_message(error):
+    missing, invalid = EXPENSE_FIELD_ERRORS[error['loc'][0]]
+    if error['type'] == 'missing':
+        return missing
+    if error['type'] == 'greater_than':
+        return 'Amount must be greater than 0'
+    if error['type'] == 'value_error':
+        return str(error['ctx']['error'])
+    return invalid
+
+def parse_expense_data(data):
+    """
+    Validate expense data, returning (ExpenseIn or None, list of error messages)
+    Blank values count as missing
+    """
+    try:
+        return ExpenseIn.model_validate({key: value for key, value in data.items() if value not in (None, '')}), []
+    except ValidationError as e:
+        return None, [_expense_error_message(error) for error in e.errors()]
+
 def validate_expense_data(data):
     """
     Validate expense data before submission
     """
-    errors = []
-    
-    if not data.get('title'):
-        errors.append('Title is required')
-    
-    if not data.get('amount'):
-        errors.append('Amount is required')
-    else:
-        try:
-            amount = Decimal(str(data['amount']))
-            if amount <= 0:
-                errors.append('Amount must be greater than 0')
-        except:
-            errors.append('Invalid amount format')
-    
-    if not data.get('expense_date'):
-        errors.append('Expense date is required')
-    else:
-        try:
-            expense_date = datetime.strptime(data['expense_date'], '%Y-%m-%d').date()
-            if expense_date > date.today():
-                errors.append('Expense date cannot be in the future')
-        except:
-            errors.append('Invalid date format')
+    return parse_expense_data(data)[1]
+
+def bulk_create_expenses(rows):
+    """
+    Validate and insert many expenses with one executemany INSERT
+    rows are dicts of Expense column values, with amount and expense_date as
+    submitted form strings; nothing is inserted if any row is invalid
+    Returns a dict of row index -> validation errors (empty on success)
+    """
+    from models import db, Expense
     
-    if not data.get('category_id'):
-        errors.append('Category is required')
+    errors = {}
+    values = []
+    for index, row in enumerate(rows):
+        expense, row_errors = parse_expense_data(row)
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            values.append(dict(row, **expense.model_dump()))
+    if errors or not rows:
+        return errors
     
+    db.session.execute(db.insert(Expense), values)
+    db.session.commit()
+    bump_report_version()
     return errors
 
 # Email notification functions (placeholder)
@@ -397,14 +1060,22 @@ def notify_expense_submission(expense):
     """
     Notify relevant parties about expense submission
     """
+    notify_expenses_submitted([expense])
+
+def notify_expenses_submitted(expenses):
+    """
+    Notify the accounting team about several submitted expenses
+    Looks up the recipients once for the whole batch
+    """
+    from models import User
+    
     # Notify accounting team
-    accounting_users = User.query.filter_by(role='accounting', is_active=True).all()
-    for user in accounting_users:
-        send_notification_email(
-            user.email,
-            f"New Expense Submitted: {expense.title}",
-            f"A new expense has been submitted by {expense.user.full_name} for {expense.tradeshow.name}"
-        )
+    recipients = [email for (email,) in User.query.with_entities(User.email).filter_by(role='accounting', is_active=True)]
+    for expense in expenses:
+        subject = f"New Expense Submitted: {expense.title}"
+        message = f"A new expense has been submitted by {expense.user.full_name} for {expense.tradeshow.name}"
+        for email in recipients:
+            send_notification_email(email, subject, message)
 
 def notify_expense_approval(expense):
     """
@@ -5,12 +5,29 @@ Handles automatic version incrementing and display
 
 import os
 import json
+import shutil
 import subprocess
 from datetime import datetime
 from pathlib import Path
 
+# orjson is optional; stdlib json produces the same compact output
+try:
+    import orjson
+    
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps(data):
+        return json.dumps(data, separators=(',', ':')).encode()
+
 # Version configuration
 VERSION_FILE = 'version.json'
+# git commands run from the project directory, resolved once
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Absolute path to git, looked up on PATH once (None when not installed)
+GIT_EXECUTABLE = shutil.which('git')
 DEFAULT_VERSION = {
     'major': 1,
     'minor': 0,
@@ -22,40 +39,96 @@ DEFAULT_VERSION = {
 }
 
 class VersionManager:
+    # False when git isn't on PATH, or once a call finds it has gone, so
+    # later calls skip spawning it
+    _git_available = GIT_EXECUTABLE is not None
+    
     def __init__(self):
         self.version_file = Path(VERSION_FILE)
-        self.version_data = self._load_version()
+        # Read from version.json on first use rather than at import, and
+        # re-read only when its mtime changes (e.g. bumped by another process)
+        self._version_data = None
+        self._mtime = None
+        self._version_string = None
+        self._version_bytes = None
+        self._full_info_cache = None
+        # (commit, branch), resolved once per process
+        self._git_cache = None
+    
+    @property
+    def version_data(self):
+        """Version data, loaded on first access"""
+        self._maybe_reload()
+        return self._version_data
+    
+    def _file_mtime(self):
+        try:
+            return self.version_file.stat().st_mtime
+        except OSError:
+            return None
+    
+    def _maybe_reload(self):
+        """Reload version data if version.json changed since it was last read"""
+        mtime = self._file_mtime()
+        if self._version_data is None or mtime != self._mtime:
+            self._version_data = self._load_version()
+            self._mtime = mtime
+            # Derived values describe the old data
+            self._version_string = None
+            self._version_bytes = None
+            self._full_info_cache = None
     
     def _load_version(self):
         """Load version data from file or create default"""
-        if self.version_file.exists():
-            try:
-                with open(self.version_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                pass
-        return DEFAULT_VERSION.copy()
+        try:
+            return json_loads(self.version_file.read_bytes())
+        except (ValueError, FileNotFoundError):
+            # Both json and orjson decode errors are ValueErrors
+            return DEFAULT_VERSION.copy()
     
     def _save_version(self):
         """Save version data to file"""
-        with open(self.version_file, 'w') as f:
-            json.dump(self.version_data, f, indent=2)
+        # Compact JSON written in one call to a temp file and renamed over
+        # version.json, so readers never see a half-written file
+        tmp_file = self.version_file.with_suffix('.json.tmp')
+        tmp_file.write_bytes(json_dumps(self.version_data))
+        os.replace(tmp_file, self.version_file)
+        self._mtime = self._file_mtime()
     
     def get_version_string(self):
         """Get formatted version string"""
-        v = self.version_data
-        return f"{v['major']}.{v['minor']}.{v['patch']}.{v['build']}"
+        self._maybe_reload()
+        if self._version_string is None:
+            v = self.version_data
+            self._version_string = f"{v['major']}.{v['minor']}.{v['patch']}.{v['build']}"
+        return self._version_string
+    
+    def get_version_bytes(self):
+        """Get the version string as ASCII bytes, e.g. for response headers"""
+        version_string = self.get_version_string()
+        if self._version_bytes is None:
+            self._version_bytes = version_string.encode('ascii')
+        return self._version_bytes
     
-    def get_full_version_info(self):
-        """Get complete version information"""
+    def get_version_info_fast(self):
+        """Get version information from version.json alone, without resolving git"""
+        return self._build_version_info(None, None)
+    
+    def get_version_info_full(self):
+        """Get complete version information (a copy of the cached snapshot)"""
+        self._maybe_reload()
+        if self._full_info_cache is None:
+            self._full_info_cache = self._build_version_info(*self._get_git_info())
+        return self._full_info_cache.copy()
+    
+    get_full_version_info = get_version_info_full
+    
+    def _build_version_info(self, git_commit, git_branch):
         v = self.version_data
-        
-        # Get git information if available
-        git_commit = self._get_git_commit()
-        git_branch = self._get_git_branch()
+        version_string = self.get_version_string()
         
         return {
-            'version': self.get_version_string(),
+            'version': version_string,
             'major': v['major'],
             'minor': v['minor'],
             'patch': v['patch'],
@@ -63,41 +136,116 @@ class VersionManager:
             'release_date': v.get('release_date'),
             'git_commit': git_commit or v.get('git_commit'),
             'git_branch': git_branch or v.get('git_branch'),
-            'display_name': f"v{self.get_version_string()}"
+            'display_name': f"v{version_string}"
         }
     
-    def _get_git_commit(self):
-        """Get current git commit hash"""
+    def preload(self):
+        """
+        Resolve version data, git details and the info snapshot up front
+        Call before a pre-forking server starts its workers so they inherit warm caches
+        """
+        self.get_version_info_full()
+        self.get_version_bytes()
+    
+    def _get_git_info(self):
+        """Get current git commit hash and branch"""
+        if self._git_cache is not None:
+            return self._git_cache
+        
+        # Failures are cached too, so a missing git binary isn't retried
+        self._git_cache = self._read_git_info()
+        return self._git_cache
+    
+    def _read_git_info(self):
+        """Resolve the commit hash and branch, reading .git directly when possible"""
         try:
-            result = subprocess.run(
-                ['git', 'rev-parse', '--short', 'HEAD'],
-                capture_output=True,
-                text=True,
-                cwd=os.path.dirname(os.path.abspath(__file__))
-            )
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except (subprocess.SubprocessError, FileNotFoundError):
+            return self._read_git_head()
+        except (OSError, UnicodeDecodeError):
+            # Not a plain checkout (e.g. a worktree or submodule)
             pass
-        return None
+        
+        try:
+            return self._read_git_pygit2()
+        except ImportError:
+            # pygit2 is optional; without it let git work it out
+            return self._run_git_rev_parse()
     
-    def _get_git_branch(self):
-        """Get current git branch"""
+    def _read_git_pygit2(self):
+        """Resolve the commit hash and branch in-process with libgit2"""
+        import pygit2
+        
+        try:
+            repo = pygit2.Repository(MODULE_DIR)
+            commit = str(repo.head.target)[:7]
+            return commit, None if repo.head_is_detached else repo.head.shorthand
+        except (pygit2.GitError, KeyError):
+            # Not a repository, or HEAD has no commits yet
+            return None, None
+    
+    def _read_git_head(self):
+        """Read the commit hash and branch from .git/HEAD and the ref it points to"""
+        git_dir = Path(MODULE_DIR) / '.git'
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            # A detached HEAD holds the commit hash itself and has no branch name
+            return head[:7], None
+        
+        ref = head[len('ref: '):]
         try:
-            result = subprocess.run(
-                ['git', 'branch', '--show-current'],
-                capture_output=True,
-                text=True,
-                cwd=os.path.dirname(os.path.abspath(__file__))
+            commit = (git_dir / ref).read_text().strip()
+        except FileNotFoundError:
+            commit = self._read_packed_ref(git_dir, ref)
+        return commit[:7], ref.removeprefix('refs/heads/')
+    
+    def _read_packed_ref(self, git_dir, ref):
+        """Look a ref up in .git/packed-refs, where git gc moves loose refs"""
+        for line in (git_dir / 'packed-refs').read_text().splitlines():
+            commit, _, name = line.partition(' ')
+            if name == ref:
+                return commit
+        raise FileNotFoundError(ref)
+    
+    def _run_git_rev_parse(self):
+        """Run git to resolve the commit hash and branch"""
+        if not VersionManager._git_available:
+            return None, None
+        
+        try:
+            # --short can't be combined with a second revision, so the full
+            # hash is abbreviated here to git's default length
+            output = subprocess.check_output(
+                [GIT_EXECUTABLE, 'rev-parse', 'HEAD', '--abbrev-ref', 'HEAD'],
+                stderr=subprocess.DEVNULL,
+                cwd=MODULE_DIR
             )
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except (subprocess.SubprocessError, FileNotFoundError):
+            commit, branch = output.decode('utf-8', 'replace').splitlines()
+            # A detached HEAD has no branch name
+            return commit[:7], None if branch == 'HEAD' else branch
+        except FileNotFoundError:
+            VersionManager._git_available = False
+        except (subprocess.SubprocessError, OSError, ValueError):
             pass
-        return None
+        return None, None
+    
+    def invalidate_git_cache(self):
+        """Forget the cached git information after changing the repository"""
+        self._git_cache = None
+        self._full_info_cache = None
+    
+    def _get_git_commit(self):
+        """Get current git commit hash"""
+        return self._get_git_info()[0]
+    
+    def _get_git_branch(self):
+        """Get current git branch"""
+        return self._get_git_info()[1]
     
-    def increment_version(self, version_type='patch'):
-        """Increment version number"""
+    def increment_version(self, version_type='patch', create_tag=False):
+        """
+        Increment version number
+        With create_tag, also tag the current commit for the new version
+        (git info is already cached, so only the tag itself spawns git)
+        """
         if version_type == 'major':
             self.version_data['major'] += 1
             self.version_data['minor'] = 0
@@ -110,28 +258,40 @@ class VersionManager:
         
         # Always increment build number
         self.version_data['build'] += 1
+        self._version_string = None
+        self._version_bytes = None
         
         # Update metadata
         self.version_data['release_date'] = datetime.now().isoformat()
-        self.version_data['git_commit'] = self._get_git_commit()
-        self.version_data['git_branch'] = self._get_git_branch()
+        self.version_data['git_commit'], self.version_data['git_branch'] = self._get_git_info()
         
+        self._full_info_cache = None
         self._save_version()
+        
+        if create_tag:
+            self.create_git_tag()
         return self.get_version_string()
     
     def create_git_tag(self):
         """Create git tag for current version"""
+        if not VersionManager._git_available:
+            return None
+        
         version = self.get_version_string()
         tag_name = f"v{version}"
         
         try:
             # Create annotated tag
             subprocess.run([
-                'git', 'tag', '-a', tag_name, '-m', f"Release version {version}"
-            ], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+                GIT_EXECUTABLE, 'tag', '-a', tag_name, '-m', f"Release version {version}"
+            ], check=True, cwd=MODULE_DIR)
+            self.invalidate_git_cache()
             
             return tag_name
-        except (subprocess.SubprocessError, FileNotFoundError):
+        except FileNotFoundError:
+            VersionManager._git_available = False
+            return None
+        except subprocess.SubprocessError:
             return None
 
 # Global version manager instance
@@ -141,13 +301,25 @@ def get_version():
     """Get current version string"""
     return version_manager.get_version_string()
 
+def get_version_bytes():
+    """Get current version string as bytes"""
+    return version_manager.get_version_bytes()
+
 def get_version_info():
     """Get complete version information"""
     return version_manager.get_full_version_info()
 
-def increment_version(version_type='patch'):
-    """Increment version and return new version string"""
-    return version_manager.increment_version(version_type)
+def get_version_info_fast():
+    """Get version information without git details beyond those saved in version.json"""
+    return version_manager.get_version_info_fast()
+
+def preload_version_info():
+    """Warm the version caches, e.g. in a server's master process before it forks"""
+    version_manager.preload()
+
+def increment_version(version_type='patch', create_tag=False):
+    """Increment version, optionally tag it, and return new version string"""
+    return version_manager.increment_version(version_type, create_tag)
 
 def create_release_tag():
     """Create git tag for current version"""